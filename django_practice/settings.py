@@ -126,5 +126,69 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CRONJOBS = [
-    ('0 * * * *', 'django.core.management.call_command', ['save_studies']),
-]
\ No newline at end of file
+    ('0 * * * *', 'django.core.management.call_command', ['save_studies', '--sync-updated-studies', '--distributed']),
+]
+
+# clinicaltrials.gov API
+
+CLINICALTRIALS_FETCH_WORKERS = 4
+
+CLINICALTRIALS_REQUESTS_PER_SECOND = 5
+
+# (connect, read) timeout in seconds for clinicaltrials.gov requests; timed out or failed
+# connections are retried like 5xx responses
+CLINICALTRIALS_REQUEST_TIMEOUT = (10, 60)
+
+PIPELINE_QUEUE_SIZE = 200
+
+PIPELINE_CONVERT_WORKERS = 1
+
+# None: the translation backend's max_concurrency
+PIPELINE_TRANSLATE_WORKERS = None
+
+# Number of studies converted together by convert_studies_batch (and handed to a convert worker)
+CONVERT_BATCH_SIZE = 100
+
+# Number of studies handed to a translate worker at a time (`save_studies --translate --workers N`)
+TRANSLATE_BATCH_SIZE = 20
+
+# A study that fails convert or translate this many times in a row is quarantined
+# (left out of the READY backlog until its original_data changes)
+STUDY_MAX_FAILURES = 3
+
+# Published study versions are kept (append-only); `prune_study_versions` keeps this many
+# most recent versions per study and deletes older ones with the rows only they still use
+STUDY_VERSION_KEEP = 10
+
+# Translation backend: 'translate' (translate package provider), 'local' (offline, dictionary
+# or identity), 'stub' (fixed latency, for load tests) or a dotted path to a TranslationBackend.
+# OPTIONS may override max_concurrency, max_batch_length and requests_per_second.
+TRANSLATION_BACKEND = {
+    'BACKEND': 'translate',
+    'OPTIONS': {
+        'max_concurrency': 2,
+        'requests_per_second': 5,
+    },
+}
+
+# Translated strings kept in memory in front of the TranslationMemory table
+TRANSLATION_MEMORY_LRU_SIZE = 10000
+
+# Condition rows kept in memory (name/original condition -> id) by the convert and translate tasks
+CONDITION_CACHE_SIZE = 50000
+
+# `save_studies --distributed` leases a work unit for this long and renews it every third of it
+WORK_UNIT_LEASE_SECONDS = 600
+
+# A work unit that raised this many times is marked FAILED until the next run
+WORK_UNIT_MAX_ATTEMPTS = 3
+
+# Raw clinicaltrials.gov responses are recorded here (None disables the cache); they are only read
+# back with `save_studies --replay-from-cache` or `--resume-from-cache`
+CLINICALTRIALS_PAGE_CACHE_DIR = None
+
+# `prune_page_cache` keeps cached pages fetched within this many days
+CLINICALTRIALS_PAGE_CACHE_KEEP_DAYS = 7
+
+# sha256, sha3_256, blake2b or blake2s; run `rehash_original_data` after changing it
+ORIGINAL_DATA_HASH_ALGORITHM = 'sha256'
@@ -3,4 +3,11 @@ from django.db import models
 class ControlStatusType(models.IntegerChoices):
     CONVERT_READY = 20, 'CONVERT_READY'
     TRANSLATE_READY = 50, 'TRANSLATE_READY'
-    COMPLETED = 100, 'COMPLETED'
\ No newline at end of file
+    COMPLETED = 100, 'COMPLETED'
+
+
+class WorkUnitStatus(models.IntegerChoices):
+    PENDING = 0, 'PENDING'
+    CLAIMED = 50, 'CLAIMED'
+    DONE = 100, 'DONE'
+    FAILED = 200, 'FAILED'
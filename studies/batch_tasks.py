@@ -1,94 +1,68 @@
-import requests
+from django.conf import settings
 from rest_framework.exceptions import ValidationError
 from tqdm import tqdm
-from time import sleep
-from translate import Translator
 from django.db import transaction
-from django.db.models import Prefetch
+from django.db.models import F, Prefetch, Q, prefetch_related_objects
 import traceback
-import hashlib
+from contextlib import nullcontext
 import json
-from copy import deepcopy
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from datetime import date, timedelta
 
-from .models import ConfigurationVariable, Study, Condition, Intervention, Eligibility
+from .models import ConfigurationVariable, Study, StudyRawDocument, StudyVersion, Condition, Intervention, Eligibility
 from .assets import ControlStatusType
-from .serializers import StudySerializer
+from .hashing import CONVERT_MODULES, encode_original_data, get_changed_modules, get_module_hashes, get_original_data_hash
+from .condition_cache import condition_cache
+from .clinicaltrials import get_studies, get_studies_num, get_studies_page, get_updated_since_expr, iter_studies_pages
+from .translation import translate_many
+from .translation_memory import translation_memory
+from .parallel import get_write_lock, iter_pk_ranges, run_sharded
+from .writers import lock_study, save_study
 
 TRANSLATE_FIELDS = ['title', 'overall_status', 'phase']
-
-def get_original_data_hash(original_data):
-    return hashlib.sha256(json.dumps(original_data).encode('utf-8')).hexdigest()
+BULK_CREATE_BATCH_SIZE = 500
+CONVERT_BATCH_SIZE = getattr(settings, 'CONVERT_BATCH_SIZE', 100)
+TRANSLATE_BATCH_SIZE = getattr(settings, 'TRANSLATE_BATCH_SIZE', 20)
 
 def get_nct_id(study):
     return study['Study']['ProtocolSection']['IdentificationModule']['NCTId']
 
-def get_studies_num():
-    """
-    clinicaltrials.gov 에 존재하는 임상 연구 개수를 가져오는 메소드
-    """
-    CLINICALTRIALS_STATISTICS_URL = 'https://clinicaltrials.gov/api/info/study_statistics'
-    response = requests.get(CLINICALTRIALS_STATISTICS_URL, params={'fmt': 'json'})
-    studies_num = int(response.json()['StudyStatistics']['ElmtDefs']['Study']['nInstances'])
-    return studies_num
+def get_intervention_key(intervention):
+    return (intervention.name, intervention.intervention_type, intervention.description)
 
-def get_studies(start, end, sleep_count = 0):
+def get_eligibility_key(eligibility):
+    return (eligibility.gender, eligibility.minimum_age, eligibility.maximum_age, eligibility.healthy_volunteers, eligibility.criteria)
+
+def index_instances(instances, get_key):
     """
-    clinicaltrials.gov 에서 제공하는 API 에서 임상 연구 목록을 가져오는 메소드
+    instance 를 내용(get_key) 기준으로 매칭할 수 있도록 {내용: [pk]} 로 만드는 메소드
     """
-    if sleep_count >= 10:
-        raise ValidationError('clinicaltrials.gov API 요청 제한')
-    
-    CLINICALTRIALS_OPEN_API_BASE_URL = 'https://clinicaltrials.gov/api/query/full_studies'
-    response = requests.get(CLINICALTRIALS_OPEN_API_BASE_URL, params={'fmt': 'json', 'min_rnk': start, 'max_rnk': end})
-    
-    if response.status_code == 404:
-        raise ValidationError('clinicaltrials.gov API 응답 없음')
+    index = defaultdict(list)
+    for instance in instances:
+        index[get_key(instance)].append(instance.pk)
+    return index
 
-    if response.status_code == 401 or response.status_code == 403:
-        sleep(600)
-        get_studies(start, end, sleep_count+1)
-    
-    if response.status_code//100 == 5:
-        sleep(60)
-        get_studies(start, end, sleep_count+1)
+def group_by(instances, attname):
+    groups = defaultdict(list)
+    for instance in instances:
+        groups[getattr(instance, attname)].append(instance)
+    return groups
 
-    response_json = response.json()
-    if response_json['FullStudiesResponse']['NStudiesFound'] == 0:
-        return []
-    return response_json['FullStudiesResponse']['FullStudies']
-
-def convert_conditions(condition_module):
-    conditions = []
-    condition_instances = list(Condition.objects.filter(name__in=condition_module))
-    for condition in condition_module:
-        condition_id = None
-        for condition_instance in condition_instances:
-            if condition_instance.name == condition:
-                condition_id = condition_instance.id
-                break
-        conditions.append({
-            'id':  condition_id,
-            'name': condition,
-            'locale': 'en',
-        })
-    return conditions
+def convert_conditions(condition_module, condition_ids):
+    return [{
+        'id': condition_ids.get(condition),
+        'name': condition,
+        'locale': 'en',
+    } for condition in condition_module]
 
-def convert_interventions(study, intervention_module):
+def convert_interventions(intervention_module, intervention_index):
     interventions = []
-    intervention_instances = list(Intervention.objects.filter(study=study))
     for intervention in intervention_module:
-        intervention_id = None
-        for intervention_instance in intervention_instances:
-            if (
-                intervention_instance.name == intervention.get('InterventionName', None) and \
-                intervention_instance.intervention_type == intervention.get('InterventionType', None) and \
-                intervention_instance.description == intervention.get('InterventionDescription', None)
-            ):
-                intervention_id = intervention_instance.pk
-                intervention_instances.remove(intervention_instance)
-                break
+        key = (intervention.get('InterventionName', None), intervention.get('InterventionType', None), intervention.get('InterventionDescription', None))
         interventions.append({
-            'id': intervention_id,
+            'id': intervention_index[key].pop(0) if intervention_index.get(key) else None,
             'intervention_type': intervention.get('InterventionType', None),
             'name': intervention.get('InterventionName', None),
             'description': intervention.get('InterventionDescription', None),
@@ -96,24 +70,18 @@ def convert_interventions(study, intervention_module):
         })
     return interventions
 
-def convert_eligibilities(study, eligibility_module):
+def convert_eligibilities(eligibility_module, eligibility_index):
     if eligibility_module is None:
         return []
-    eligibility_instances = list(Eligibility.objects.filter(study=study))
-    eligibility_id = None
-    for eligibility_instance in eligibility_instances:
-        if (
-            eligibility_instance.gender == eligibility_module.get('Gender', None) and \
-            eligibility_instance.minimum_age == eligibility_module.get('MinimumAge', None) and \
-            eligibility_instance.maximum_age == eligibility_module.get('MaximumAge', None) and \
-            eligibility_instance.healthy_volunteers == eligibility_module.get('HealthyVolunteers', None) and \
-            eligibility_instance.criteria == eligibility_module.get('EligibilityCriteria', None)
-        ):
-            eligibility_id = eligibility_instance.pk
-            eligibility_instances.remove(eligibility_instance)
-            break
+    key = (
+        eligibility_module.get('Gender', None),
+        eligibility_module.get('MinimumAge', None),
+        eligibility_module.get('MaximumAge', None),
+        eligibility_module.get('HealthyVolunteers', None),
+        eligibility_module.get('EligibilityCriteria', None),
+    )
     return [{
-        'id': eligibility_id,
+        'id': eligibility_index[key].pop(0) if eligibility_index.get(key) else None,
         'gender': eligibility_module.get('Gender', None),
         'minimum_age': eligibility_module.get('MinimumAge', None),
         'maximum_age': eligibility_module.get('MaximumAge', None),
@@ -122,59 +90,132 @@ def convert_eligibilities(study, eligibility_module):
         'locale': 'en',
     }]
 
-def mark_updated_sutdy_field(study, convert_data):
-    translated_studies = Study.objects.filter(translate_from_study=study)
-    for field in TRANSLATE_FIELDS:
-        if getattr(study, field) != convert_data[field]:
-            for translated_study in translated_studies:
-                setattr(translated_study, field, "<updated>")
-    for translated_study in translated_studies:
-        translated_study.save()
+def mark_updated_sutdy_field(study_ids_by_field):
+    """
+    원문이 바뀐 번역 필드를 번역된 임상 연구에 "<updated>" 로 표시하는 메소드
+    study_ids_by_field 는 {번역 필드: 그 필드의 원문이 바뀐 임상 연구 id 목록} 이며, 필드마다 UPDATE 한 번으로 표시한다
+    """
+    for field, study_ids in study_ids_by_field.items():
+        Study.objects.filter(translate_from_study_id__in=study_ids).update(**{field: "<updated>"})
 
-def convert_study(study):
-    original_data = study.original_data
-    if type(original_data) is not dict:
-        original_data = json.loads(original_data)
-    description_module = original_data['Study']['ProtocolSection'].get('DescriptionModule', {})
-
-    if 'OfficialTitle' in description_module:
-        title = description_module['OfficialTitle']
-    elif 'BriefTitle' in description_module:
-        title = description_module['BriefTitle']
-    elif 'BriefSummary' in description_module:
-        title = description_module['BriefSummary']
-    else:
-        title = None
+def get_condition_module(original_data):
+    return original_data['Study']['ProtocolSection'].get('ConditionsModule', {}).get('ConditionList', {}).get('Condition', [])
 
+def build_convert_data(original_data, intervention_index, eligibility_index, condition_ids, modules=CONVERT_MODULES):
+    """
+    original_data 중 modules 에 해당하는 부분만 변환한 임상 연구 데이터를 만드는 메소드
+    변환하지 않은 module 의 필드와 하위 데이터는 data 에 넣지 않으므로 저장할 때 그대로 유지된다
+    """
+    protocol_section = original_data['Study']['ProtocolSection']
     convert_data = {
-        'nct_id': original_data['Study']['ProtocolSection']['IdentificationModule']['NCTId'],
-        'title': title,
-        'results_first_submitted_date': description_module.get('ResultsFirstSubmittedDate', None),
-        'last_update_submitted_date': description_module.get('LastUpdateSubmittedDate', None),
-        'start_date': description_module.get('StartDate', None),
-        'completion_date': description_module.get('CompletionDate', None),
-        'overall_status': description_module.get('OverallStatus', None),
-        'phase': description_module.get('Phase', None),
-        'enrollment': description_module.get('Enrollment', None),
-        'interventions': convert_interventions(study, original_data['Study']['ProtocolSection'].get('ArmsInterventionsModule', {}).get('InterventionList', {}).get('Intervention', [])),
-        'conditions': convert_conditions(original_data['Study']['ProtocolSection'].get('ConditionsModule', {}).get('ConditionList', {}).get('Condition', [])),
-        'eligibilities': convert_eligibilities(study, original_data['Study']['ProtocolSection'].get('EligibilityModule', None)),
+        'nct_id': protocol_section['IdentificationModule']['NCTId'],
+        'module_hashes': get_module_hashes(original_data),
         'locale': 'en',
         'translate_from_study': None,
         'control_status_type': ControlStatusType.TRANSLATE_READY,
     }
-    mark_updated_sutdy_field(study, convert_data)
+
+    if 'DescriptionModule' in modules:
+        description_module = protocol_section.get('DescriptionModule', {})
+        if 'OfficialTitle' in description_module:
+            title = description_module['OfficialTitle']
+        elif 'BriefTitle' in description_module:
+            title = description_module['BriefTitle']
+        elif 'BriefSummary' in description_module:
+            title = description_module['BriefSummary']
+        else:
+            title = None
+        convert_data.update({
+            'title': title,
+            'results_first_submitted_date': description_module.get('ResultsFirstSubmittedDate', None),
+            'last_update_submitted_date': description_module.get('LastUpdateSubmittedDate', None),
+            'start_date': description_module.get('StartDate', None),
+            'completion_date': description_module.get('CompletionDate', None),
+            'overall_status': description_module.get('OverallStatus', None),
+            'phase': description_module.get('Phase', None),
+            'enrollment': description_module.get('Enrollment', None),
+        })
+    if 'ArmsInterventionsModule' in modules:
+        convert_data['interventions'] = convert_interventions(protocol_section.get('ArmsInterventionsModule', {}).get('InterventionList', {}).get('Intervention', []), intervention_index)
+    if 'ConditionsModule' in modules:
+        convert_data['conditions'] = convert_conditions(get_condition_module(original_data), condition_ids)
+    if 'EligibilityModule' in modules:
+        convert_data['eligibilities'] = convert_eligibilities(protocol_section.get('EligibilityModule', None), eligibility_index)
     return convert_data
 
-def translate(text):
-    if text is None:
-        return None
-    translator = Translator(to_lang='ko')
-    return translator.translate(text)
+def get_study_ids_by_module(studies, changed_modules):
+    """
+    module 별로 해당 module 이 바뀐 임상 연구 id 목록을 반환하는 메소드
+    """
+    study_ids = {module: [] for module in CONVERT_MODULES}
+    for study in studies:
+        for module in changed_modules[study.pk]:
+            study_ids[module].append(study.pk)
+    return study_ids
+
+def convert_studies_batch(studies, write_lock=None):
+    """
+    여러 임상 연구의 original_data를 한 번에 변환하여 [(study, convert_data)] 로 반환하는 메소드
+    변환은 write_lock 밖에서, condition 생성과 "<updated>" 표시만 write_lock 안에서 진행한다
+    마지막으로 변환한 original_data 와 module 별 hash(module_hashes)를 비교하여 바뀐 module 만 변환하고,
+    원본 문서, 하위 데이터, condition 은 바뀐 module 의 임상 연구만 임상 연구 개수와 상관없이 일정한 수의 쿼리로 조회한다
+    기존 하위 데이터는 내용을 key 로 하는 dict 로 매칭하며, 번역된 임상 연구의 "<updated>" 표시는 바뀐 필드마다 UPDATE 한 번으로 한다
+    """
+    studies = list(studies)
+    prefetch_related_objects(studies, 'raw_document')
+    original_datas, changed_modules = [], {}
+    for study in studies:
+        original_data = study.original_data
+        if type(original_data) is not dict:
+            original_data = json.loads(original_data)
+        original_datas.append(original_data)
+        changed_modules[study.pk] = get_changed_modules(get_module_hashes(original_data), study.module_hashes)
+    study_ids = get_study_ids_by_module(studies, changed_modules)
+
+    interventions = group_by(Intervention.objects.current().filter(study_id__in=study_ids['ArmsInterventionsModule']), 'study_id')
+    eligibilities = group_by(Eligibility.objects.current().filter(study_id__in=study_ids['EligibilityModule']), 'study_id')
+    # 같은 batch 의 임상 연구들이 새 condition 을 각각 만들지 않도록 없는 condition 은 미리 한 번에 만든다
+    conditions = {
+        name: Condition(name=name, locale='en')
+        for name in sorted({
+            condition for study, original_data in zip(studies, original_datas) if 'ConditionsModule' in changed_modules[study.pk]
+            for condition in get_condition_module(original_data)
+        })
+    }
+    with write_lock or nullcontext():
+        condition_cache.get_or_create_many(conditions.values())
+    condition_ids = {name: condition.pk for name, condition in conditions.items()}
+
+    converted_studies, updated_study_ids = [], {}
+    for study, original_data in zip(studies, original_datas):
+        convert_data = build_convert_data(
+            original_data,
+            index_instances(interventions[study.pk], get_intervention_key),
+            index_instances(eligibilities[study.pk], get_eligibility_key),
+            condition_ids,
+            changed_modules[study.pk],
+        )
+        for field in TRANSLATE_FIELDS:
+            if field in convert_data and getattr(study, field) != convert_data[field]:
+                updated_study_ids.setdefault(field, []).append(study.pk)
+        converted_studies.append((study, convert_data))
+    with write_lock or nullcontext():
+        mark_updated_sutdy_field(updated_study_ids)
+    return converted_studies
+
+def convert_study(study):
+    return convert_studies_batch([study])[0][1]
+
+def get_first(instances):
+    """
+    prefetch 된 instance 목록의 첫 번째 instance 를 쿼리 없이 반환하는 메소드
+    """
+    return next(iter(instances), None)
 
-def translate_study(study, translated_study=None):
+def build_translated_data(study, translated_study, conditions, interventions, eligibilities, translate):
     """
-    임상 연구 데이터를 번역하는 메소드
+    임상 연구 데이터를 translate(원문) 으로 번역한 데이터를 만드는 메소드
+    이미 번역된 하위 데이터는 그대로 사용하고, conditions, interventions, eligibilities 가 None 이면 해당 하위 데이터는 data 에 넣지 않는다
     """
     translated_text_dict = {translate_field:None for translate_field in TRANSLATE_FIELDS}
     if translated_study is not None:
@@ -185,28 +226,28 @@ def translate_study(study, translated_study=None):
         if translated_text_dict[translate_field] is None and getattr(study, translate_field) is not None:
             translated_text_dict[translate_field] = translate(getattr(study, translate_field))
 
-    conditions = []
-    for condition in study.conditions.all().prefetch_related(Prefetch("translated_conditions", queryset=Condition.objects.filter(locale='ko'))):
-        translated_condition = condition.translated_conditions.first()
+    translated_conditions = []
+    for condition in conditions or []:
+        translated_condition = get_first(condition.translated_conditions.all())
         if translated_condition is not None:
-            conditions.append({
+            translated_conditions.append({
                 'id': translated_condition.pk,
                 'name': translated_condition.name,
                 'locale': 'ko',
                 'translate_from_condition': condition.pk
             })
         else:
-            conditions.append({
+            translated_conditions.append({
                 'name': translate(condition.name),
                 'locale': 'ko',
                 'translate_from_condition': condition.pk
             })
 
-    interventions = []
-    for intervention in Intervention.objects.filter(study=study).prefetch_related(Prefetch("translated_interventions", queryset=Intervention.objects.filter(locale='ko'))):
-        translated_intervention = intervention.translated_interventions.first()
+    translated_interventions = []
+    for intervention in interventions or []:
+        translated_intervention = get_first(intervention.translated_interventions.all())
         if translated_intervention is not None:
-            interventions.append({
+            translated_interventions.append({
                 'id': translated_intervention.pk,
                 'intervention_type': translated_intervention.intervention_type,
                 'name': translated_intervention.name,
@@ -215,7 +256,7 @@ def translate_study(study, translated_study=None):
                 'translate_from_intervention': intervention.pk
             })
         else:
-            interventions.append({
+            translated_interventions.append({
                 'intervention_type': translate(intervention.intervention_type),
                 'name': translate(intervention.name),
                 'description': translate(intervention.description),
@@ -223,11 +264,11 @@ def translate_study(study, translated_study=None):
                 'translate_from_intervention': intervention.pk
             })
 
-    eligibilities = []
-    for eligibility in Eligibility.objects.filter(study=study).prefetch_related(Prefetch("translated_eligibilities", queryset=Eligibility.objects.filter(locale='ko'))):
-        translated_eligibility = eligibility.translated_eligibilities.first()
+    translated_eligibilities = []
+    for eligibility in eligibilities or []:
+        translated_eligibility = get_first(eligibility.translated_eligibilities.all())
         if translated_eligibility is not None:
-            eligibilities.append({
+            translated_eligibilities.append({
                 'id': translated_eligibility.pk,
                 'gender': translated_eligibility.gender,
                 'minimum_age': translated_eligibility.minimum_age,
@@ -238,7 +279,7 @@ def translate_study(study, translated_study=None):
                 'translate_from_eligibility': eligibility.pk
             })
         else:
-            eligibilities.append({
+            translated_eligibilities.append({
                 'gender': translate(eligibility.gender),
                 'minimum_age': eligibility.minimum_age,
                 'maximum_age': eligibility.maximum_age,
@@ -248,7 +289,7 @@ def translate_study(study, translated_study=None):
                 'translate_from_eligibility': eligibility.pk
             })
 
-    return {
+    translated_data = {
         'nct_id': study.nct_id,
         'title': translated_text_dict['title'],
         'results_first_submitted_date': study.results_first_submitted_date,
@@ -258,13 +299,265 @@ def translate_study(study, translated_study=None):
         'overall_status': translated_text_dict['overall_status'],
         'phase': translated_text_dict['phase'],
         'enrollment': study.enrollment,
-        'interventions': interventions,
-        'conditions': conditions,
-        'eligibilities': eligibilities,
+        'interventions': translated_interventions,
+        'conditions': translated_conditions,
+        'eligibilities': translated_eligibilities,
         'locale': 'ko',
         'translate_from_study': study.pk,
+        'version': study.version,
+        'module_hashes': study.module_hashes,
         'control_status_type': ControlStatusType.COMPLETED,
     }
+    for field_name, instances in (('interventions', interventions), ('conditions', conditions), ('eligibilities', eligibilities)):
+        if instances is None:
+            del translated_data[field_name]
+    return translated_data
+
+def translate_studies_batch(studies):
+    """
+    여러 임상 연구를 한 번에 번역하여 [(study, translated_study, translated_data)] 로 반환하는 메소드
+    하위 데이터는 번역된 임상 연구의 module_hashes 와 비교하여 바뀐 module 의 하위 데이터만 조회하여 번역한다
+    번역해야 하는 원문을 먼저 모두 모은 뒤 translate_many 로 중복 없이 묶어서 번역하고, 결과를 각 임상 연구에 나누어 넣는다
+    """
+    studies = list(studies)
+    translated_studies = {}
+    for translated_study in Study.objects.filter(translate_from_study_id__in=[study.pk for study in studies], locale='ko').order_by('id'):
+        translated_studies.setdefault(translated_study.translate_from_study_id, translated_study)
+    changed_modules = {
+        study.pk: get_changed_modules(study.module_hashes or {}, getattr(translated_studies.get(study.pk), 'module_hashes', None))
+        for study in studies
+    }
+    study_ids = get_study_ids_by_module(studies, changed_modules)
+    prefetch_related_objects([study for study in studies if study.pk in study_ids['ConditionsModule']], Prefetch('conditions', queryset=Condition.objects.order_by('id').prefetch_related(
+        Prefetch('translated_conditions', queryset=Condition.objects.filter(locale='ko').order_by('id')),
+    )))
+    interventions = group_by(Intervention.objects.current().filter(study_id__in=study_ids['ArmsInterventionsModule']).order_by('id').prefetch_related(
+        Prefetch('translated_interventions', queryset=Intervention.objects.current().filter(locale='ko').order_by('id')),
+    ), 'study_id')
+    eligibilities = group_by(Eligibility.objects.current().filter(study_id__in=study_ids['EligibilityModule']).order_by('id').prefetch_related(
+        Prefetch('translated_eligibilities', queryset=Eligibility.objects.current().filter(locale='ko').order_by('id')),
+    ), 'study_id')
+
+    def get_arguments(study):
+        modules = changed_modules[study.pk]
+        return (
+            study,
+            translated_studies.get(study.pk),
+            study.conditions.all() if 'ConditionsModule' in modules else None,
+            interventions[study.pk] if 'ArmsInterventionsModule' in modules else None,
+            eligibilities[study.pk] if 'EligibilityModule' in modules else None,
+        )
+
+    texts = []
+    for study in studies:
+        build_translated_data(*get_arguments(study), lambda text: texts.append(text))
+    translations = translate_many(texts, 'ko')
+    return [
+        (study, translated_studies.get(study.pk), build_translated_data(*get_arguments(study), lambda text: None if text is None else translations[text]))
+        for study in studies
+    ]
+
+def save_new_studies(studies):
+    """
+    한 페이지의 임상 연구 중 신규 임상 연구의 original_data를 한 번에 저장하고 저장된 임상 연구 목록을 반환하는 메소드
+    nct_id 존재 여부는 nct_id__in 쿼리 한 번으로 확인하고, 신규 임상 연구는 bulk_create 로 저장한다
+    """
+    original_datas = {get_nct_id(original_data): original_data for original_data in studies}
+    with transaction.atomic():
+        existing_nct_ids = set(Study.objects.filter(nct_id__in=original_datas.keys()).values_list('nct_id', flat=True))
+        new_original_datas = {}
+        for nct_id, original_data in original_datas.items():
+            if nct_id not in existing_nct_ids:
+                original_data_text = encode_original_data(original_data)
+                new_original_datas[nct_id] = (original_data_text, get_original_data_hash(original_data_text))
+        raw_documents = StudyRawDocument.objects.get_or_create_many({original_data_hash: original_data_text for original_data_text, original_data_hash in new_original_datas.values()})
+        new_studies = []
+        for nct_id, (original_data_text, original_data_hash) in new_original_datas.items():
+            raw_document = raw_documents[original_data_hash]
+            new_studies.append(Study(raw_document=raw_document, control_status_type=ControlStatusType.CONVERT_READY, original_data_hash=original_data_hash, nct_id=nct_id))
+        new_studies = Study.objects.bulk_create(new_studies, batch_size=BULK_CREATE_BATCH_SIZE)
+        if new_studies and new_studies[0].pk is None:
+            # bulk_create 가 pk 를 반환하지 않는 backend
+            new_studies = list(Study.objects.filter(nct_id__in=[study.nct_id for study in new_studies], translate_from_study__isnull=True))
+    return new_studies
+
+def save_updated_studies(studies):
+    """
+    한 페이지의 임상 연구 중 original_data가 변경된 임상 연구에 새 버전의 original_data 를 저장하고, convert 해야 하는 임상 연구 목록을 반환하는 메소드
+    저장된 original_data 는 불러오지 않고 (nct_id, original_data_hash)만 한 번에 조회하여 비교한다
+    convert 단계에서 읽는 module 이 바뀐 임상 연구는 복제하지 않고 버전 번호만 올리므로, 새 버전이 게시(StudyVersion.objects.publish)될 때까지 이전 버전이 조회되고,
+    그 외의 module 만 바뀐 임상 연구는 original_data 만 바꾸고 convert, translate 하지 않는다
+    """
+    original_datas = {}
+    for original_data in studies:
+        original_data_text = encode_original_data(original_data)
+        original_datas[get_nct_id(original_data)] = (original_data, original_data_text, get_original_data_hash(original_data_text))
+
+    with transaction.atomic():
+        original_studies = Study.objects.filter(
+            nct_id__in=original_datas.keys(), translate_from_study__isnull=True,
+        ).values_list('id', 'nct_id', 'original_data_hash')
+        updated_nct_ids = {
+            study_id: nct_id for study_id, nct_id, original_data_hash in original_studies
+            if original_data_hash != original_datas[nct_id][2]
+        }
+        if not updated_nct_ids:
+            return []
+
+        raw_documents = StudyRawDocument.objects.get_or_create_many({original_datas[nct_id][2]: original_datas[nct_id][1] for nct_id in updated_nct_ids.values()})
+        updated_studies, converted_studies = list(Study.objects.filter(pk__in=updated_nct_ids.keys()).order_by('id')), []
+        previous_raw_document_ids = {study.raw_document_id for study in updated_studies}
+        for study in updated_studies:
+            original_data, original_data_text, original_data_hash = original_datas[study.nct_id]
+            study.raw_document = raw_documents[original_data_hash]
+            study.original_data_hash = original_data_hash
+            if get_changed_modules(get_module_hashes(original_data), study.module_hashes):
+                study.control_status_type = ControlStatusType.CONVERT_READY
+                study.version += 1
+                # 격리된 임상 연구도 원본이 바뀌면 다시 처리한다
+                study.failure_count = 0
+                converted_studies.append(study)
+        Study.objects.bulk_update(updated_studies, ['raw_document', 'original_data_hash', 'control_status_type', 'version', 'failure_count'])
+        # convert 단계에서 읽지 않는 module 만 바뀌었다면 게시된 버전도 새 original_data 에서 변환한 것과 같다
+        converted_study_ids = {study.pk for study in converted_studies}
+        unchanged_studies = {study.pk: study for study in updated_studies if study.pk not in converted_study_ids}
+        published_versions = list(StudyVersion.objects.filter(study_id__in=unchanged_studies.keys(), number=F('study__version')))
+        for version in published_versions:
+            version.raw_document = unchanged_studies[version.study_id].raw_document
+            version.original_data_hash = unchanged_studies[version.study_id].original_data_hash
+        StudyVersion.objects.bulk_update(published_versions, ['raw_document', 'original_data_hash'])
+        # 게시된 버전이 사용하지 않는 이전 원본 문서(적재 중에 다시 바뀐 원본 문서)는 삭제한다
+        StudyRawDocument.objects.filter(id__in=previous_raw_document_ids, studies__isnull=True, versions__isnull=True).delete()
+    return converted_studies
+
+def store_studies(studies, only_new=False):
+    """
+    한 페이지의 original_data를 저장하고 convert, translate 해야 하는 임상 연구 목록을 반환하는 메소드
+    """
+    new_studies = save_new_studies(studies)
+    if only_new:
+        return new_studies
+    return new_studies + save_updated_studies(studies)
+
+def save_converted_study(study):
+    """
+    original_data를 변환하여 임상 연구 데이터를 저장하는 메소드
+    """
+    with transaction.atomic():
+        save_study(convert_study(study), instance=study)
+
+def is_nct_id_unique_error(error):
+    return isinstance(error.detail, dict) and error.detail.get('nct_id', None) is not None and error.detail['nct_id'][0].code == 'unique'
+
+def is_superseded_error(error):
+    """
+    변환, 번역하는 동안 새 버전이 적재되어(writers.lock_study) 저장하지 않은 경우, 새 버전은 다시 변환, 번역되므로 실패가 아니다
+    """
+    return isinstance(error.detail, dict) and error.detail.get('version', None) is not None and error.detail['version'][0].code == 'superseded'
+
+def save_converted_studies(studies, write_lock=None):
+    """
+    여러 임상 연구의 original_data를 convert_studies_batch 로 한 번에 변환하여 저장하고, 저장에 성공한 임상 연구 목록을 반환하는 메소드
+    일괄 변환에 실패하면 임상 연구 하나씩 변환하여 실패한 임상 연구만 건너뛴다
+    변환은 write_lock 밖에서, 저장은 write_lock 안에서 진행한다
+    """
+    condition_cache.warm()
+    try:
+        converted_studies = convert_studies_batch(studies, write_lock)
+    except Exception:
+        converted_studies = []
+        for study in studies:
+            try:
+                converted_studies.extend(convert_studies_batch([study], write_lock))
+            except Exception:
+                traceback.print_exc()
+
+    saved_studies = []
+    for study, convert_data in converted_studies:
+        try:
+            with write_lock or nullcontext(), transaction.atomic():
+                save_study(convert_data, instance=study)
+            saved_studies.append(study)
+        except ValidationError as e:
+            if not is_nct_id_unique_error(e) and not is_superseded_error(e):
+                traceback.print_exc()
+        except Exception:
+            traceback.print_exc()
+    return saved_studies
+
+def save_translated_data(study, translated_study, translated_data, write_lock=None):
+    """
+    번역된 임상 연구 데이터를 저장하고 적재를 완료한 뒤 적재 중인 버전을 게시하는 메소드
+    번역하는 동안 원문 임상 연구에 새 버전이 적재되었으면 저장하지 않는다
+    """
+    with write_lock or nullcontext(), transaction.atomic():
+        translation_memory.flush()
+        lock_study(study)
+        save_study(translated_data, instance=translated_study)
+        study.control_status_type = ControlStatusType.COMPLETED
+        study.save(update_fields=['control_status_type'])
+        StudyVersion.objects.publish(study)
+
+def save_translated_study(study, write_lock=None):
+    """
+    임상 연구 데이터를 번역하여 저장하고 적재를 완료하는 메소드
+    번역(외부 API 요청)은 write_lock 밖에서, 저장은 write_lock 안에서 진행한다
+    """
+    save_translated_data(*translate_studies_batch([study])[0], write_lock)
+
+def save_translated_studies(studies, write_lock=None):
+    """
+    여러 임상 연구를 translate_studies_batch 로 한 번에 번역하여 저장하고, 저장에 성공한 임상 연구 목록을 반환하는 메소드
+    일괄 번역에 실패하면 임상 연구 하나씩 번역하여 실패한 임상 연구만 건너뛴다
+    """
+    condition_cache.warm()
+    try:
+        translated_studies = translate_studies_batch(studies)
+    except Exception:
+        traceback.print_exc()
+        translated_studies = []
+        for study in studies:
+            try:
+                translated_studies.append(translate_studies_batch([study])[0])
+            except Exception:
+                traceback.print_exc()
+
+    saved_studies = []
+    for study, translated_study, translated_data in translated_studies:
+        try:
+            save_translated_data(study, translated_study, translated_data, write_lock)
+            saved_studies.append(study)
+        except ValidationError as e:
+            if not is_nct_id_unique_error(e) and not is_superseded_error(e):
+                traceback.print_exc()
+        except Exception:
+            traceback.print_exc()
+    return saved_studies
+
+def load_studies(studies, write_lock=None):
+    """
+    한 페이지의 임상 연구를 저장 or 업데이트 하고 convert, translate 까지 진행하는 메소드
+    original_data 저장과 convert, translate 결과 저장만 write_lock 안에서 진행한다
+    """
+    with write_lock or nullcontext():
+        stored_studies = store_studies(studies)
+    save_translated_studies(save_converted_studies(stored_studies, write_lock), write_lock)
+
+def load_new_studies(studies, write_lock=None):
+    """
+    한 페이지의 임상 연구 중 신규 임상 연구를 저장하고 convert, translate 까지 진행하는 메소드
+    original_data 저장과 convert, translate 결과 저장만 write_lock 안에서 진행한다
+    """
+    with write_lock or nullcontext():
+        new_studies = save_new_studies(studies)
+    save_translated_studies(save_converted_studies(new_studies, write_lock), write_lock)
+
+def get_rank_ranges(page_size=100):
+    """
+    전체 임상 연구를 page_size 개씩 나눈 (min_rnk, max_rnk) 목록을 반환하는 메소드
+    """
+    studies_num = get_studies_num()
+    return [(start, min(start + page_size - 1, studies_num)) for start in range(1, studies_num + 1, page_size)]
 
 def save_all_studies():
     """
@@ -273,91 +566,59 @@ def save_all_studies():
     studies_num = get_studies_num()
     loaded_studies_num = int(ConfigurationVariable.objects.get_or_create(name='loaded_studies_num', defaults={'value': 1})[0].value)
     with tqdm(total=studies_num, initial=loaded_studies_num) as progress_bar:
-        for start in range(loaded_studies_num, studies_num, 100):
-            end = start + 99
-            studies = get_studies(start, end)
-            for original_data in studies:
-                # save
-                nct_id = get_nct_id(original_data)
-                study = Study.objects.filter(nct_id=nct_id).first()
-                original_data = json.dumps(original_data)
-                original_data_hash = get_original_data_hash(original_data)
-                with transaction.atomic():
-                    if study is None:
-                        study = Study(original_data=original_data, control_status_type=ControlStatusType.CONVERT_READY, original_data_hash=original_data_hash, nct_id=nct_id)
-                        study.save()
-                    elif study.original_data_hash != original_data_hash and not Study.objects.filter(clone_from_study=study).exists():
-                        study = Study.objects.get(nct_id=get_nct_id(original_data), translate_from_study__isnull=True).clone()
-                        study.original_data = original_data
-                        study.original_data_hash = original_data_hash
-                        study.control_status_type = ControlStatusType.CONVERT_READY
-                        study.save()
-                    else:
-                        progress_bar.update(1)
-                        ConfigurationVariable.objects.filter(name='loaded_studies_num').update(value=progress_bar.n)
-                        continue
-                try:
-                    # convert
-                    with transaction.atomic():
-                        study_serializer = StudySerializer(data=convert_study(study), instance=study)
-                        study_serializer.is_valid(raise_exception=True)
-                        study_serializer.save()
-
-                    # translate
-                    with transaction.atomic():
-                        translated_study_serializer = StudySerializer(data=translate_study(study))
-                        translated_study_serializer.is_valid(raise_exception=True)
-                        translated_study_serializer.save()
-                        study.control_status_type = ControlStatusType.COMPLETED
-                        study.save()
-                except ValidationError as e:
-                    if e.detail.get('nct_id', None) is not None and e.detail['nct_id'][0].code == 'unique':
-                        continue
-                    raise e
-                finally:
-                    progress_bar.update(1)
-                    ConfigurationVariable.objects.filter(name='loaded_studies_num').update(value=progress_bar.n)
+        for studies in iter_studies_pages(range(loaded_studies_num, studies_num, 100)):
+            load_studies(studies)
+            progress_bar.update(len(studies))
+            ConfigurationVariable.objects.filter(name='loaded_studies_num').update(value=progress_bar.n)
     ConfigurationVariable.objects.filter(name='loaded_studies_num').update(value=1)
 
-def convert_studies():
+def record_failures(studies, saved_studies):
+    """
+    저장하지 못한 임상 연구의 연속 실패 횟수를 늘리고, 저장한 임상 연구의 연속 실패 횟수를 초기화하는 메소드
+    연속 실패 횟수가 STUDY_MAX_FAILURES 에 이른 임상 연구는 격리되어 READY 목록에서 제외된다
+    처리하는 동안 새 버전이 적재된(superseded) 임상 연구는 실패로 세지 않는다
+    """
+    saved_study_ids = {study.pk for study in saved_studies}
+    failed_studies = [study for study in studies if study.pk not in saved_study_ids]
+    if failed_studies:
+        Study.objects.filter(reduce(or_, (Q(pk=study.pk, version=study.version) for study in failed_studies))).update(failure_count=F('failure_count') + 1)
+    Study.objects.filter(pk__in=saved_study_ids, failure_count__gt=0).update(failure_count=0)
+
+def convert_studies_range(first_id, last_id):
+    """
+    id 가 first_id 이상 last_id 이하인 CONVERT_READY 임상 연구를 변환하고 처리한 개수를 반환하는 메소드
+    """
+    studies = list(Study.objects.ready(ControlStatusType.CONVERT_READY).filter(id__gte=first_id, id__lte=last_id).order_by('id'))
+    saved_studies = save_converted_studies(studies, get_write_lock())
+    with get_write_lock():
+        record_failures(studies, saved_studies)
+    return len(studies)
+
+def translate_studies_range(first_id, last_id):
+    """
+    id 가 first_id 이상 last_id 이하인 TRANSLATE_READY 임상 연구를 번역하고 처리한 개수를 반환하는 메소드
+    """
+    studies = list(Study.objects.ready(ControlStatusType.TRANSLATE_READY).filter(id__gte=first_id, id__lte=last_id).order_by('id'))
+    saved_studies = save_translated_studies(studies, get_write_lock())
+    with get_write_lock():
+        record_failures(studies, saved_studies)
+    return len(studies)
+
+def convert_studies(workers=1):
     """
     저장된 original_data를 이용하여 임상 연구 데이터를 저장하는 메소드
+    격리되지 않은 CONVERT_READY 임상 연구 전체를 id 범위로 나누어 workers 개의 process 에서 변환한다
     """
-    studies_count = Study.objects.filter(control_status_type=ControlStatusType.CONVERT_READY).count()
-    with tqdm(total=studies_count) as progress_bar:
-        for study in Study.objects.filter(control_status_type=ControlStatusType.CONVERT_READY)[:100]:
-            with transaction.atomic():
-                try:
-                    study_serializer = StudySerializer(data=convert_study(study), instance=study)
-                    study_serializer.is_valid(raise_exception=True)
-                    study_serializer.save()
-                except:
-                    traceback.print_exc()
-                finally:
-                    progress_bar.update(1)
-
-def translate_studies():
+    queryset = Study.objects.ready(ControlStatusType.CONVERT_READY)
+    run_sharded(convert_studies_range, iter_pk_ranges(queryset, CONVERT_BATCH_SIZE), queryset.count(), workers)
+
+def translate_studies(workers=1):
     """
     저장된 임상 연구 데이터를 번역하는 메소드
+    격리되지 않은 TRANSLATE_READY 임상 연구 전체를 id 범위로 나누어 workers 개의 process 에서 번역한다
     """
-    studies_count = Study.objects.filter(control_status_type=ControlStatusType.TRANSLATE_READY).count()
-    with tqdm(total=studies_count) as progress_bar:
-        for study in Study.objects.filter(control_status_type=ControlStatusType.TRANSLATE_READY)[:100]:
-            with transaction.atomic():
-                try:
-                    translated_study = study.translated_studies.filter(locale='ko').first()
-                    if translated_study is None:
-                        translated_study_serializer = StudySerializer(data=translate_study(study))
-                    else:
-                        translated_study_serializer = StudySerializer(data=translate_study(study, translated_study), instance=translated_study)
-                    translated_study_serializer.is_valid(raise_exception=True)
-                    translated_study_serializer.save()
-                    study.control_status_type = ControlStatusType.COMPLETED
-                    study.save()
-                except:
-                    traceback.print_exc()
-                finally:
-                    progress_bar.update(1)
+    queryset = Study.objects.ready(ControlStatusType.TRANSLATE_READY)
+    run_sharded(translate_studies_range, iter_pk_ranges(queryset, TRANSLATE_BATCH_SIZE), queryset.count(), workers)
 
 def save_all_new_studies():
     """
@@ -366,41 +627,13 @@ def save_all_new_studies():
     studies_num = get_studies_num()
     loaded_new_studies_num = int(ConfigurationVariable.objects.get_or_create(name='loaded_new_studies_num', defaults={'value': 1})[0].value)
     with tqdm(total=studies_num, initial=loaded_new_studies_num) as progress_bar:
-        for start in range(1, studies_num, 100):
-            end = start + 99
-            studies = get_studies(start, end)
-            for original_data in studies:
-                # save
-                with transaction.atomic():
-                    if Study.objects.filter(nct_id=get_nct_id(original_data)).exists():
-                        progress_bar.update(1)
-                        ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=progress_bar.n)
-                        continue
-                    nct_id = get_nct_id(original_data)
-                    original_data = json.dumps(original_data)
-                    study = Study(original_data=original_data, control_status_type=ControlStatusType.CONVERT_READY, original_data_hash=get_original_data_hash(original_data), nct_id=nct_id)
-                    study.save()
-                try:
-                    # convert
-                    with transaction.atomic():
-                        study_serializer = StudySerializer(data=convert_study(study), instance=study)
-                        study_serializer.is_valid(raise_exception=True)
-                        study_serializer.save()
-
-                    # translate
-                    with transaction.atomic():
-                        translated_study_serializer = StudySerializer(data=translate_study(study))
-                        translated_study_serializer.is_valid(raise_exception=True)
-                        translated_study_serializer.save()
-                        study.control_status_type = ControlStatusType.COMPLETED
-                        study.save()
-                except:
-                    traceback.print_exc()
-                finally:
-                    progress_bar.update(1)
-                    ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=progress_bar.n)
+        for studies in iter_studies_pages(range(loaded_new_studies_num, studies_num, 100)):
+            load_new_studies(studies)
+            progress_bar.update(len(studies))
+            ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=progress_bar.n)
 
     ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=1)
+
 def save_new_study_original_datas():
     """
     clinicaltrials.gov 에서 제공하는 API 에서 신규 임상 연구 데이터를 저장하는 메소드
@@ -408,44 +641,49 @@ def save_new_study_original_datas():
     studies_num = get_studies_num()
     loaded_new_studies_num = int(ConfigurationVariable.objects.get_or_create(name='loaded_new_studies_num', defaults={'value': 1})[0].value)
     with tqdm(total=studies_num, initial=loaded_new_studies_num) as progress_bar:
-        for start in range(1, studies_num, 100):
-            end = start + 99
-            studies = get_studies(start, end)
-            for original_data in studies:
-                if Study.objects.filter(nct_id=get_nct_id(original_data)).exists():
-                    progress_bar.update(1)
-                    ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=progress_bar.n)
-                    continue
-                nct_id = get_nct_id(original_data)
-                original_data = get_original_data_hash(original_data)
-                study = Study(original_data=original_data, control_status_type=ControlStatusType.CONVERT_READY, original_data_hash=get_original_data_hash(original_data), nct_id=nct_id)
-                study.save()
-                progress_bar.update(1)
-                ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=progress_bar.n)
+        for studies in iter_studies_pages(range(loaded_new_studies_num, studies_num, 100)):
+            save_new_studies(studies)
+            progress_bar.update(len(studies))
+            ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=progress_bar.n)
 
     ConfigurationVariable.objects.filter(name='loaded_new_studies_num').update(value=1)
 
-def update_study_original_data():
+def update_study_original_data(write_lock=None):
     """
     clinicaltrials.gov 에서 제공하는 API 에서 임상 연구 데이터를 업데이트 하는 메소드
+    페이지 요청은 write_lock 밖에서, 저장은 write_lock 안에서 진행한다
     """
     studies_num = get_studies_num()
-    updated_studies_num = int(ConfigurationVariable.objects.get_or_create(name='updated_studies_num', defaults={'value': 1})[0].value)
+    with write_lock or nullcontext():
+        updated_studies_num = int(ConfigurationVariable.objects.get_or_create(name='updated_studies_num', defaults={'value': 1})[0].value)
     with tqdm(total=studies_num, initial=updated_studies_num) as progress_bar:
-        for start in range(1, studies_num, 100):
-            end = start + 99
-            studies = get_studies(start, end)
-            for original_data in studies:
-                original_study = Study.objects.filter(nct_id=get_nct_id(original_data), translate_from_study__isnull=True).first()
-                original_data = json.dumps(original_data)
-                original_data_hash = get_original_data_hash(original_data)
-                if original_study is not None and original_study.original_data_hash != original_data_hash and not Study.objects.filter(clone_from_study=original_study).exists():
-                    study = original_study.clone()
-                    study.original_data = original_data
-                    study.original_data_hash = original_data_hash
-                    study.control_status_type = ControlStatusType.CONVERT_READY
-                    study.save()
-                progress_bar.update(1)
+        for studies in iter_studies_pages(range(updated_studies_num, studies_num, 100)):
+            with write_lock or nullcontext():
+                save_updated_studies(studies)
+                progress_bar.update(len(studies))
                 ConfigurationVariable.objects.filter(name='updated_studies_num').update(value=progress_bar.n)
 
-    ConfigurationVariable.objects.filter(name='updated_studies_num').update(value=1)
+    with write_lock or nullcontext():
+        ConfigurationVariable.objects.filter(name='updated_studies_num').update(value=1)
+
+def sync_updated_studies(write_lock=None):
+    """
+    마지막 동기화 이후 clinicaltrials.gov 에서 수정된 임상 연구만 저장, 업데이트 하는 메소드
+    동기화 기준 날짜(high-water mark)는 ConfigurationVariable 의 last_update_synced_date 에 저장한다
+    페이지 요청은 write_lock 밖에서, 저장은 write_lock 안에서 진행한다
+    """
+    sync_started_date = date.today()
+    synced_date = ConfigurationVariable.objects.filter(name='last_update_synced_date').first()
+    if synced_date is None:
+        update_study_original_data(write_lock)
+    else:
+        # LastUpdatePostDate 는 미국 기준 날짜이므로 하루 겹치게 검색한다
+        expr = get_updated_since_expr(date.fromisoformat(synced_date.value) - timedelta(days=1))
+        studies_num = get_studies_page(1, 1, expr)[0]
+        with tqdm(total=studies_num) as progress_bar:
+            for studies in iter_studies_pages(range(1, studies_num + 1, 100), expr=expr):
+                with write_lock or nullcontext():
+                    store_studies(studies)
+                progress_bar.update(len(studies))
+    with write_lock or nullcontext():
+        ConfigurationVariable.objects.update_or_create(name='last_update_synced_date', defaults={'value': sync_started_date.isoformat()})
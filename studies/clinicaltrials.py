@@ -0,0 +1,150 @@
+import hashlib
+import json
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from time import sleep
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from rest_framework.exceptions import ValidationError
+
+from .page_cache import page_cache
+from .ratelimit import RateLimiter
+
+CLINICALTRIALS_STATISTICS_URL = 'https://clinicaltrials.gov/api/info/study_statistics'
+CLINICALTRIALS_OPEN_API_BASE_URL = 'https://clinicaltrials.gov/api/query/full_studies'
+
+FETCH_WORKERS = getattr(settings, 'CLINICALTRIALS_FETCH_WORKERS', 4)
+REQUESTS_PER_SECOND = getattr(settings, 'CLINICALTRIALS_REQUESTS_PER_SECOND', 5)
+# (connect, read) timeout 초
+REQUEST_TIMEOUT = getattr(settings, 'CLINICALTRIALS_REQUEST_TIMEOUT', (10, 60))
+MAX_RETRY_COUNT = 10
+SERVER_ERROR_WAIT = 60
+
+rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS))
+
+
+def get_retry_after(response, default):
+    """
+    응답의 Retry-After 헤더(초 또는 HTTP-date)를 대기 시간(초)으로 변환하는 메소드
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None:
+        return default
+    if retry_after.isdigit():
+        return int(retry_after)
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return default
+    return max(0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def request(url, params):
+    """
+    공유 session과 rate limiter를 이용해 clinicaltrials.gov API를 요청하는 메소드
+    연결 실패, timeout 은 5xx 응답과 같이 기다렸다가 다시 요청한다
+    """
+    for _ in range(MAX_RETRY_COUNT):
+        rate_limiter.acquire()
+        try:
+            response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            wait = SERVER_ERROR_WAIT
+        else:
+            if response.status_code == 404:
+                raise ValidationError('clinicaltrials.gov API 응답 없음')
+
+            if response.status_code in (401, 403, 429):
+                wait = get_retry_after(response, 600)
+            elif response.status_code//100 == 5:
+                wait = get_retry_after(response, SERVER_ERROR_WAIT)
+            else:
+                return response
+        rate_limiter.pause(wait)
+        sleep(wait)
+    raise ValidationError('clinicaltrials.gov API 요청 제한')
+
+
+def fetch_json(url, params, cache_key, resumable=True):
+    """
+    replay, resume 모드에서는 page_cache 에 저장된 응답이 있으면 사용하고, 없으면 API 를 요청해 캐시한 뒤 json 으로 반환하는 메소드
+    개수, 증분 동기화 검색 결과처럼 시점에 따라 바뀌는 응답(resumable=False)은 replay 모드에서만 캐시에서 읽는다
+    """
+    if page_cache is not None and (page_cache.replaying or page_cache.resuming and resumable):
+        content = page_cache.get(cache_key)
+        if content is not None:
+            return json.loads(content)
+        if page_cache.replaying:
+            raise ValidationError(f'{page_cache.replay_date} 에 캐시된 {cache_key} 페이지 없음')
+    content = request(url, params).content
+    if page_cache is not None:
+        page_cache.put(cache_key, content)
+    return json.loads(content)
+
+
+def get_studies_num():
+    """
+    clinicaltrials.gov 에 존재하는 임상 연구 개수를 가져오는 메소드
+    """
+    response_json = fetch_json(CLINICALTRIALS_STATISTICS_URL, {'fmt': 'json'}, 'study_statistics', resumable=False)
+    studies_num = int(response_json['StudyStatistics']['ElmtDefs']['Study']['nInstances'])
+    return studies_num
+
+
+def get_studies_page(start, end, expr=None):
+    """
+    min_rnk=start, max_rnk=end 범위의 검색 결과와 전체 검색 결과 개수를 가져오는 메소드
+    """
+    params = {'fmt': 'json', 'min_rnk': start, 'max_rnk': end}
+    cache_key = f'{start}-{end}'
+    if expr is not None:
+        params['expr'] = expr
+        cache_key = f'{cache_key}-{hashlib.sha256(expr.encode()).hexdigest()[:16]}'
+    response_json = fetch_json(CLINICALTRIALS_OPEN_API_BASE_URL, params, cache_key, resumable=expr is None)
+    studies_found = response_json['FullStudiesResponse']['NStudiesFound']
+    if studies_found == 0:
+        return 0, []
+    return studies_found, response_json['FullStudiesResponse'].get('FullStudies', [])
+
+
+def get_studies(start, end, expr=None):
+    """
+    clinicaltrials.gov 에서 제공하는 API 에서 임상 연구 목록을 가져오는 메소드
+    """
+    return get_studies_page(start, end, expr)[1]
+
+
+def get_updated_since_expr(since):
+    """
+    since 이후 수정된 임상 연구를 검색하는 clinicaltrials.gov 검색식을 만드는 메소드
+    """
+    return f'AREA[LastUpdatePostDate]RANGE[{since:%m/%d/%Y}, MAX]'
+
+
+def iter_studies_pages(starts, page_size=100, workers=None, expr=None):
+    """
+    최대 workers개의 페이지를 동시에 요청하면서 starts 순서대로 임상 연구 목록을 반환하는 메소드
+    """
+    workers = workers or FETCH_WORKERS
+    starts = iter(starts)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for start in islice(starts, workers * 2):
+                in_flight.append(executor.submit(get_studies, start, start + page_size - 1, expr))
+            while in_flight:
+                studies = in_flight.popleft().result()
+                next_start = next(starts, None)
+                if next_start is not None:
+                    in_flight.append(executor.submit(get_studies, next_start, next_start + page_size - 1, expr))
+                yield studies
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Condition
+
+CACHE_SIZE = getattr(settings, 'CONDITION_CACHE_SIZE', 50000)
+
+
+class ConditionCache:
+    """
+    condition 의 unique key(Condition.get_unique_key) 로 pk 를 찾는 process 내부 LRU
+
+    condition 어휘는 작고 반복되므로 batch, task 시작 시 transaction 밖에서 maxsize 개까지 한 번에 읽어 두고,
+    없는 condition 만 Condition.objects.get_or_create_many 로 한 번에 찾거나 생성한다
+    """
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.warmed = False
+        self._cache = OrderedDict()
+        self._lock = Lock()
+
+    def _remember(self, key, condition_id):
+        self._cache[key] = condition_id
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _remember_many(self, condition_ids):
+        with self._lock:
+            for key, condition_id in condition_ids:
+                self._remember(key, condition_id)
+
+    def warm(self):
+        """
+        LRU 를 한 번 채우는 메소드, rollback 될 수 있는 condition 을 읽지 않도록 transaction 밖에서 호출한다
+        """
+        if self.warmed or connection.in_atomic_block:
+            return
+        # 최근에 생성된 condition 을 maxsize 개까지 읽어 오래된 것부터 LRU 에 넣는다
+        conditions = list(Condition.objects.order_by('-id').only('id', 'name', 'original_condition', 'locale')[:self.maxsize])[::-1]
+        with self._lock:
+            for condition in conditions:
+                self._remember(condition.get_unique_key(), condition.pk)
+            self.warmed = True
+
+    def get_or_create_many(self, conditions):
+        """
+        저장되지 않은 conditions 와 같은 condition 을 찾거나 생성하여 각 condition 의 pk 를 채우는 메소드
+        새로 찾거나 생성한 condition 은 rollback 될 수 있으므로 transaction 이 commit 된 뒤에 LRU 에 넣는다
+        """
+        self.warm()
+        missing_conditions = []
+        with self._lock:
+            for condition in conditions:
+                key = condition.get_unique_key()
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    condition.pk = self._cache[key]
+                    condition._state.adding, condition._state.db = False, Condition.objects.db
+                else:
+                    missing_conditions.append(condition)
+        Condition.objects.get_or_create_many(missing_conditions)
+        condition_ids = [(condition.get_unique_key(), condition.pk) for condition in missing_conditions if condition.pk is not None]
+        if condition_ids:
+            transaction.on_commit(lambda: self._remember_many(condition_ids))
+        return conditions
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.warmed = False
+
+
+condition_cache = ConditionCache()
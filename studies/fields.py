@@ -0,0 +1,77 @@
+import zlib
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+COMPRESSED_PREFIX = b'zlib:'
+
+
+class CompressedText:
+    """
+    DB 에서 읽어온 압축된 값, 모델 필드에 처음 접근할 때 압축을 푼다
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def decompress(self):
+        return zlib.decompress(self.data[len(COMPRESSED_PREFIX):]).decode('utf-8')
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    CompressedText 를 처음 읽을 때 압축을 풀고 그 결과를 instance 에 저장하는 descriptor
+    """
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = value.decompress()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    문자열을 zlib 으로 압축하여 저장하는 필드
+
+    압축 전 TextField 로 저장된 값(str 또는 prefix 가 없는 bytes)도 그대로 읽을 수 있다
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, compression_level=6, **kwargs):
+        self.compression_level = compression_level
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.compression_level != 6:
+            kwargs['compression_level'] = self.compression_level
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if value.startswith(COMPRESSED_PREFIX):
+            return CompressedText(value)
+        return value.decode('utf-8')
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return value.decompress()
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, CompressedText):
+            return value.data
+        if isinstance(value, str):
+            return COMPRESSED_PREFIX + zlib.compress(value.encode('utf-8'), self.compression_level)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
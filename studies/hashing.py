@@ -0,0 +1,126 @@
+import hashlib
+import json
+from django.conf import settings
+from django.db import transaction
+
+from .assets import ControlStatusType
+
+ORIGINAL_DATA_HASH_ALGORITHM = getattr(settings, 'ORIGINAL_DATA_HASH_ALGORITHM', 'sha256')
+
+# Study.original_data_hash(max_length=64) 에 저장할 수 있는 256bit hash 알고리즘
+HASH_ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'sha3_256': hashlib.sha3_256,
+    'blake2b': lambda data: hashlib.blake2b(data, digest_size=32),
+    'blake2s': hashlib.blake2s,
+}
+
+
+def encode_original_data(original_data):
+    """
+    original_data를 key 정렬된 canonical json 으로 직렬화하는 메소드
+    저장하는 문자열과 hash 하는 문자열이 같으므로 임상 연구마다 한 번만 직렬화하면 된다
+    """
+    return json.dumps(original_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def get_original_data_hash(original_data, algorithm=None):
+    """
+    original_data의 hash 를 구하는 메소드
+    str, bytes 는 다시 직렬화하지 않고 그대로, dict 는 encode_original_data 로 직렬화하여 hash 한다
+    """
+    if isinstance(original_data, dict):
+        original_data = encode_original_data(original_data)
+    if isinstance(original_data, str):
+        original_data = original_data.encode('utf-8')
+    algorithm = algorithm or ORIGINAL_DATA_HASH_ALGORITHM
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f'지원하지 않는 hash 알고리즘: {algorithm}')
+    return HASH_ALGORITHMS[algorithm](original_data).hexdigest()
+
+
+# convert 단계에서 읽는 ProtocolSection 의 module
+CONVERT_MODULES = ['DescriptionModule', 'ArmsInterventionsModule', 'ConditionsModule', 'EligibilityModule']
+
+
+def get_module_hashes(original_data):
+    """
+    original_data 중 convert 단계에서 읽는 module 별 hash 를 구하는 메소드 (없는 module 의 hash 는 None)
+    """
+    protocol_section = original_data['Study']['ProtocolSection']
+    return {module: get_original_data_hash(protocol_section[module]) if module in protocol_section else None for module in CONVERT_MODULES}
+
+
+def get_changed_modules(module_hashes, previous_module_hashes):
+    """
+    previous_module_hashes 와 hash 가 다른 module 목록을 반환하는 메소드, 이전 hash 가 없으면 모든 module 이 바뀐 것으로 본다
+    """
+    if previous_module_hashes is None:
+        return list(CONVERT_MODULES)
+    return [module for module in CONVERT_MODULES if module_hashes.get(module) != previous_module_hashes.get(module)]
+
+
+def rehash_raw_documents(raw_document_model, study_model, study_version_model, chunk_size=500, progress_bar=None):
+    """
+    저장된 원본 문서를 canonical json 으로 다시 저장하고 data_hash, original_data_hash, module_hashes 를 다시 계산하는 메소드
+    data migration 에서도 사용하므로 model 을 인자로 받는다
+    다시 직렬화한 결과가 같은 원본 문서는 하나로 합친다
+    임상 연구 json 이 아닌 원본 문서(이전 save_new_study_original_datas 가 hash 를 저장한 문서)는 그대로 두고,
+    이를 참조하는 임상 연구는 original_data_hash 를 비워 다음 업데이트 때 원본 문서를 다시 저장하도록 한다
+    """
+    last_id = 0
+    while True:
+        documents = list(raw_document_model.objects.filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not documents:
+            break
+        last_id = documents[-1].id
+        # 이전에 저장된 원본 문서는 canonical json 이 아닐 수 있으므로 다시 직렬화하여 hash 한다
+        original_datas, invalid_document_ids = {}, []
+        for document in documents:
+            try:
+                original_data = json.loads(document.data)
+            except ValueError:
+                original_data = None
+            if isinstance(original_data, dict) and 'Study' in original_data:
+                original_datas[document.id] = original_data
+            else:
+                invalid_document_ids.append(document.id)
+        original_data_texts = {document_id: encode_original_data(original_data) for document_id, original_data in original_datas.items()}
+        data_hashes = {document_id: get_original_data_hash(original_data_text) for document_id, original_data_text in original_data_texts.items()}
+        with transaction.atomic():
+            study_model.objects.filter(raw_document_id__in=invalid_document_ids).update(
+                original_data_hash=None, module_hashes=None, control_status_type=ControlStatusType.CONVERT_READY,
+            )
+            document_ids = dict(raw_document_model.objects.filter(data_hash__in=data_hashes.values()).values_list('data_hash', 'id'))
+            updated_documents, merged_document_ids = [], {}
+            for document in documents:
+                if document.id not in original_datas:
+                    continue
+                kept_document_id = document_ids.setdefault(data_hashes[document.id], document.id)
+                if kept_document_id != document.id:
+                    merged_document_ids[document.id] = kept_document_id
+                elif document.data_hash != data_hashes[document.id] or document.data != original_data_texts[document.id]:
+                    document.data_hash, document.data = data_hashes[document.id], original_data_texts[document.id]
+                    updated_documents.append(document)
+            for document_id, kept_document_id in merged_document_ids.items():
+                study_model.objects.filter(raw_document_id=document_id).update(raw_document_id=kept_document_id)
+                study_version_model.objects.filter(raw_document_id=document_id).update(raw_document_id=kept_document_id)
+            raw_document_model.objects.filter(id__in=merged_document_ids.keys()).delete()
+            raw_document_model.objects.bulk_update(updated_documents, ['data_hash', 'data'])
+
+            # 합쳐진 원본 문서를 참조하던 임상 연구, 버전은 남긴 원본 문서를 참조한다
+            kept_document_ids = {document_ids[data_hash]: document_id for document_id, data_hash in data_hashes.items()}
+            studies = list(study_model.objects.filter(raw_document_id__in=kept_document_ids.keys()).only('id', 'raw_document_id', 'original_data_hash', 'module_hashes', 'control_status_type'))
+            for study in studies:
+                document_id = kept_document_ids[study.raw_document_id]
+                study.original_data_hash = data_hashes[document_id]
+                # 이미 변환된 원본 문서만 module_hashes 를 다시 계산한다
+                if study.control_status_type != str(ControlStatusType.CONVERT_READY):
+                    study.module_hashes = get_module_hashes(original_datas[document_id])
+            study_model.objects.bulk_update(studies, ['original_data_hash', 'module_hashes'])
+            versions = list(study_version_model.objects.filter(raw_document_id__in=kept_document_ids.keys()).only('id', 'raw_document_id', 'original_data_hash'))
+            for version in versions:
+                version.original_data_hash = data_hashes[kept_document_ids[version.raw_document_id]]
+            study_version_model.objects.bulk_update(versions, ['original_data_hash'])
+        if progress_bar is not None:
+            progress_bar.update(len(documents))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from studies.assets import ControlStatusType
+from studies.models import Study, StudyVersion, Condition, Intervention
+
+
+def get_query_plans():
+    """
+    적재 task 의 주요 쿼리와 해당 쿼리가 사용해야 하는 index 이름 목록 (None 이면 어떤 index 든 사용하면 된다)
+    """
+    return [
+        ('nct_id page lookup', Study.objects.filter(nct_id__in=['NCT00000000'], translate_from_study__isnull=True), 'study_nct_id_idx'),
+        ('READY backlog', Study.objects.ready(ControlStatusType.CONVERT_READY).filter(id__gt=0).order_by('id'), 'study_control_status_idx'),
+        ('condition name lookup', Condition.objects.filter(normalized_name__in=['cancer'], original_condition__isnull=True), 'condition_unique_name'),
+        ('translated condition lookup', Condition.objects.filter(original_condition__in=[1]), None),
+        ('translated study lookup', Study.objects.filter(translate_from_study=1, locale='ko'), None),
+        ('intervention lookup', Intervention.objects.filter(study=1), None),
+        ('published version lookup', StudyVersion.objects.filter(study=1, number=1), None),
+    ]
+
+
+class Command(BaseCommand):
+    help = '적재 task 의 주요 쿼리가 index 를 사용하는지 확인'
+
+    def handle(self, *args, **options):
+        failed_queries = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # 데이터가 적은 DB 에서도 index 사용 가능 여부를 확인할 수 있도록 seq scan 을 막는다
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset, index_name in get_query_plans():
+                plan = queryset.explain()
+                if index_name is None:
+                    uses_index = 'index' in plan.lower()
+                else:
+                    uses_index = index_name in plan
+                self.stdout.write(f'[{"OK" if uses_index else "FAIL"}] {name}: {index_name or "any index"}')
+                self.stdout.write(f'    {plan}')
+                if not uses_index:
+                    failed_queries.append(name)
+        if failed_queries:
+            raise CommandError(f'index 를 사용하지 않는 쿼리: {", ".join(failed_queries)}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from tqdm import tqdm
+
+from studies.fields import CompressedText
+from studies.models import StudyRawDocument
+
+
+class Command(BaseCommand):
+    help = '압축되지 않은 임상연구 원본 문서(StudyRawDocument)를 chunk 단위로 압축'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="number of raw documents compressed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        with tqdm(total=StudyRawDocument.objects.count()) as progress_bar:
+            while True:
+                documents = list(StudyRawDocument.objects.filter(id__gt=last_id).order_by('id').only('id', 'data')[:chunk_size])
+                if not documents:
+                    break
+                last_id = documents[-1].id
+                # descriptor 를 거치지 않고 DB 에서 읽은 값을 확인해야 압축을 풀지 않는다
+                uncompressed_documents = [document for document in documents if not isinstance(document.__dict__['data'], CompressedText)]
+                with transaction.atomic():
+                    StudyRawDocument.objects.bulk_update(uncompressed_documents, ['data'])
+                progress_bar.update(len(documents))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from studies.page_cache import page_cache
+
+
+class Command(BaseCommand):
+    help = '오래된 clinicaltrials.gov 응답 캐시(page_cache) 정리'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=getattr(settings, 'CLINICALTRIALS_PAGE_CACHE_KEEP_DAYS', 7),
+            help="keep pages fetched within this many days",
+        )
+
+    def handle(self, *args, **options):
+        if page_cache is None:
+            raise CommandError("CLINICALTRIALS_PAGE_CACHE_DIR is not configured")
+        pruned_objects_num = page_cache.prune(options["keep_days"])
+        self.stdout.write(f'{pruned_objects_num} cached objects pruned')
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from studies.models import StudyVersion
+
+
+class Command(BaseCommand):
+    help = '오래된 임상연구 버전(StudyVersion) 정리'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=getattr(settings, 'STUDY_VERSION_KEEP', 10),
+            help="keep this many most recent versions per study",
+        )
+
+    def handle(self, *args, **options):
+        if options["keep"] < 1:
+            raise CommandError("--keep must be at least 1")
+        pruned_versions_num = StudyVersion.objects.prune(options["keep"])
+        self.stdout.write(f'{pruned_versions_num} study versions pruned')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from tqdm import tqdm
+
+from studies.hashing import rehash_raw_documents
+from studies.models import Study, StudyRawDocument, StudyVersion
+
+
+class Command(BaseCommand):
+    help = '저장된 원본 문서로 원본 문서 data_hash, 임상연구 original_data_hash, module_hashes를 다시 계산'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="number of raw documents rehashed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        with tqdm(total=StudyRawDocument.objects.count()) as progress_bar:
+            rehash_raw_documents(StudyRawDocument, Study, StudyVersion, chunk_size=options["chunk_size"], progress_bar=progress_bar)
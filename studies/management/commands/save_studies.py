@@ -1,6 +1,10 @@
 from enum import Enum
-from django.core.management.base import BaseCommand
-from studies.batch_tasks import save_all_studies, convert_studies, translate_studies, save_study_original_datas, save_all_new_studies, save_new_study_original_datas, update_study_original_data
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from studies.batch_tasks import save_all_studies, convert_studies, translate_studies, save_all_new_studies, save_new_study_original_datas, update_study_original_data, sync_updated_studies
+from studies.page_cache import page_cache
+from studies.pipeline import save_studies_pipelined
+from studies.work_units import process_work_units
 
 class CommandAction(Enum):
     SAVE_ALL_STUDIES = "save_all_studies"
@@ -9,6 +13,7 @@ class CommandAction(Enum):
     SAVE_ALL_NEW_STUDIES = "save_all_new_studies"
     SAVE_NEW_ORIGINAL_DATA = "save_new_original_data"
     UPDATE_ORIGINAL_DATA = "update_original_data"
+    SYNC_UPDATED_STUDIES = "sync_updated_studies"
 
 
 class Command(BaseCommand):
@@ -21,6 +26,17 @@ class Command(BaseCommand):
         CommandAction.SAVE_ALL_NEW_STUDIES: save_all_new_studies,
         CommandAction.SAVE_NEW_ORIGINAL_DATA: save_new_study_original_datas,
         CommandAction.UPDATE_ORIGINAL_DATA: update_study_original_data,
+        CommandAction.SYNC_UPDATED_STUDIES: sync_updated_studies,
+    }
+
+    sharded_actions = {
+        CommandAction.CONVERT: convert_studies,
+        CommandAction.TRANSLATE: translate_studies,
+    }
+
+    pipelined_actions = {
+        CommandAction.SAVE_ALL_STUDIES: lambda: save_studies_pipelined(),
+        CommandAction.SAVE_ALL_NEW_STUDIES: lambda: save_studies_pipelined(only_new=True),
     }
 
     def add_arguments(self, parser):
@@ -66,7 +82,64 @@ class Command(BaseCommand):
             const=CommandAction.UPDATE_ORIGINAL_DATA,
             help="update original data",
         )
+        parser.add_argument(
+            "--sync-updated-studies",
+            action="store_const",
+            dest="action",
+            const=CommandAction.SYNC_UPDATED_STUDIES,
+            help="save or update only studies updated since the last sync",
+        )
+        parser.add_argument(
+            "--pipeline",
+            action="store_true",
+            help="run fetch, store, convert and translate stages concurrently (--save-all-studies, --save-all-new-studies)",
+        )
+        parser.add_argument(
+            "--distributed",
+            action="store_true",
+            help="claim rank ranges or READY study batches from the shared work unit table so several processes and hosts can run the same action",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="number of worker processes draining the whole backlog (--convert, --translate)",
+        )
+        parser.add_argument(
+            "--replay-from-cache",
+            nargs="?",
+            const="latest",
+            metavar="FETCH_DATE",
+            help="read clinicaltrials.gov pages only from the page cache (default: latest cached date)",
+        )
+        parser.add_argument(
+            "--resume-from-cache",
+            action="store_true",
+            help="read pages already cached today from the page cache and request only the missing ones",
+        )
 
 
     def handle(self, *args, **options):
-        self.actions[options["action"]]()
\ No newline at end of file
+        if options["replay_from_cache"] is not None:
+            if page_cache is None:
+                raise CommandError("CLINICALTRIALS_PAGE_CACHE_DIR is not configured")
+            try:
+                page_cache.replay(None if options["replay_from_cache"] == "latest" else options["replay_from_cache"])
+            except ValidationError as e:
+                raise CommandError(e.detail[0])
+        elif options["resume_from_cache"]:
+            if page_cache is None:
+                raise CommandError("CLINICALTRIALS_PAGE_CACHE_DIR is not configured")
+            page_cache.resume()
+        if options["distributed"]:
+            if options["pipeline"] or options["workers"] != 1:
+                raise CommandError("--distributed cannot be combined with --pipeline or --workers; start more processes instead")
+            process_work_units(options["action"].value)
+            return
+        if options["pipeline"] and options["action"] in self.pipelined_actions:
+            self.pipelined_actions[options["action"]]()
+            return
+        if options["action"] in self.sharded_actions:
+            self.sharded_actions[options["action"]](workers=options["workers"])
+            return
+        self.actions[options["action"]]()
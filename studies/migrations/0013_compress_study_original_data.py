@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:36
+
+from django.db import migrations
+import studies.fields
+
+
+def convert_original_data_to_bytea(apps, schema_editor):
+    # postgresql 의 text::bytea 변환은 backslash 를 escape 로 해석하므로 utf-8 bytes 로 직접 변환한다
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE studies_study ALTER COLUMN original_data TYPE bytea USING convert_to(original_data, \'UTF8\')')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0012_alter_study_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_original_data_to_bytea, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='study',
+            name='original_data',
+            field=studies.fields.CompressedTextField(blank=True, null=True, verbose_name='원본 데이터'),
+        ),
+    ]
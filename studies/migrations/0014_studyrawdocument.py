@@ -0,0 +1,72 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+import studies.fields
+
+CHUNK_SIZE = 500
+
+
+def move_original_data_to_raw_documents(apps, schema_editor):
+    Study = apps.get_model('studies', 'Study')
+    StudyRawDocument = apps.get_model('studies', 'StudyRawDocument')
+    last_id = 0
+    while True:
+        studies = list(Study.objects.filter(id__gt=last_id, original_data__isnull=False).order_by('id').only('id', 'original_data')[:CHUNK_SIZE])
+        if not studies:
+            break
+        last_id = studies[-1].id
+        data_hashes = {study.id: hashlib.sha256(study.original_data.encode('utf-8')).hexdigest() for study in studies}
+        existing_data_hashes = set(StudyRawDocument.objects.filter(data_hash__in=data_hashes.values()).values_list('data_hash', flat=True))
+        new_documents = {}
+        for study in studies:
+            data_hash = data_hashes[study.id]
+            if data_hash not in existing_data_hashes:
+                new_documents[data_hash] = StudyRawDocument(data_hash=data_hash, data=study.original_data)
+        StudyRawDocument.objects.bulk_create(new_documents.values())
+        document_ids = dict(StudyRawDocument.objects.filter(data_hash__in=data_hashes.values()).values_list('data_hash', 'id'))
+        for study in studies:
+            study.raw_document_id = document_ids[data_hashes[study.id]]
+        Study.objects.bulk_update(studies, ['raw_document'])
+
+
+def move_raw_documents_to_original_data(apps, schema_editor):
+    Study = apps.get_model('studies', 'Study')
+    last_id = 0
+    while True:
+        studies = list(Study.objects.filter(id__gt=last_id, raw_document__isnull=False).order_by('id').select_related('raw_document')[:CHUNK_SIZE])
+        if not studies:
+            break
+        last_id = studies[-1].id
+        for study in studies:
+            study.original_data = study.raw_document.data
+        Study.objects.bulk_update(studies, ['original_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0013_compress_study_original_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyRawDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_hash', models.CharField(max_length=64, unique=True, verbose_name='data sha256 hash')),
+                ('data', studies.fields.CompressedTextField(verbose_name='원본 데이터')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='study',
+            name='raw_document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='studies', to='studies.studyrawdocument', verbose_name='원본 데이터'),
+        ),
+        migrations.RunPython(move_original_data_to_raw_documents, move_raw_documents_to_original_data),
+        migrations.RemoveField(
+            model_name='study',
+            name='original_data',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0014_studyrawdocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='study',
+            name='original_data_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='original_data hash (ORIGINAL_DATA_HASH_ALGORITHM)'),
+        ),
+    ]
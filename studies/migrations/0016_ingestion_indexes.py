@@ -0,0 +1,25 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0015_alter_study_original_data_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='condition',
+            index=models.Index(fields=['name', 'locale'], name='condition_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=models.Index(fields=['nct_id', 'translate_from_study', 'clone_from_study'], name='study_nct_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=models.Index(fields=['control_status_type', 'id'], name='study_control_status_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0016_ingestion_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkUnit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=50, verbose_name='작업 이름')),
+                ('start', models.IntegerField(verbose_name='범위 시작')),
+                ('end', models.IntegerField(verbose_name='범위 끝')),
+                ('status', models.CharField(choices=[(0, 'PENDING'), (50, 'CLAIMED'), (100, 'DONE'), (200, 'FAILED')], default=0, max_length=50, verbose_name='작업 상태')),
+                ('owner', models.CharField(blank=True, max_length=200, null=True, verbose_name='작업자')),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True, verbose_name='할당 만료 시각')),
+                ('attempts', models.IntegerField(default=0, verbose_name='할당 횟수')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='workunit',
+            index=models.Index(fields=['task', 'status', 'start'], name='work_unit_claim_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='workunit',
+            unique_together={('task', 'start', 'end')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0017_work_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64, verbose_name='원문 sha256 hash')),
+                ('locale', models.CharField(max_length=2, verbose_name='언어코드')),
+                ('source_text', models.TextField(verbose_name='원문')),
+                ('translated_text', models.TextField(verbose_name='번역문')),
+            ],
+            options={
+                'unique_together': {('source_hash', 'locale')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.1.13 on 2026-10-18 04:56
+
+from collections import defaultdict
+from django.db import migrations, models
+
+CHUNK_SIZE = 500
+
+
+def normalize_condition_name(name):
+    if name is None:
+        return None
+    return ' '.join(name.split()).casefold()
+
+
+def merge_conditions(Condition, groups):
+    """
+    같은 key 의 condition 중 가장 먼저 생성된 condition 만 남기고, 나머지의 임상연구 연결과 번역본을 옮긴 뒤 삭제한다
+    """
+    StudyCondition = Condition.studies.through
+    for condition_ids in groups.values():
+        if len(condition_ids) < 2:
+            continue
+        survivor_id, duplicate_ids = condition_ids[0], condition_ids[1:]
+        linked_study_ids = set(StudyCondition.objects.filter(condition_id=survivor_id).values_list('study_id', flat=True))
+        duplicate_links = StudyCondition.objects.filter(condition_id__in=duplicate_ids)
+        StudyCondition.objects.bulk_create([
+            StudyCondition(study_id=study_id, condition_id=survivor_id)
+            for study_id in set(duplicate_links.values_list('study_id', flat=True)) - linked_study_ids
+        ])
+        duplicate_links.delete()
+        Condition.objects.filter(original_condition_id__in=duplicate_ids).update(original_condition_id=survivor_id)
+        Condition.objects.filter(id__in=duplicate_ids).delete()
+
+
+def deduplicate_conditions(apps, schema_editor):
+    Condition = apps.get_model('studies', 'Condition')
+    last_id = 0
+    while True:
+        conditions = list(Condition.objects.filter(id__gt=last_id).order_by('id').only('id', 'name')[:CHUNK_SIZE])
+        if not conditions:
+            break
+        last_id = conditions[-1].id
+        for condition in conditions:
+            condition.normalized_name = normalize_condition_name(condition.name)
+        Condition.objects.bulk_update(conditions, ['normalized_name'])
+
+    groups = defaultdict(list)
+    for condition_id, normalized_name, locale in Condition.objects.filter(original_condition__isnull=True, normalized_name__isnull=False).order_by('id').values_list('id', 'normalized_name', 'locale').iterator():
+        groups[(normalized_name, locale)].append(condition_id)
+    merge_conditions(Condition, groups)
+
+    groups = defaultdict(list)
+    for condition_id, original_condition_id, locale in Condition.objects.filter(original_condition__isnull=False).order_by('id').values_list('id', 'original_condition_id', 'locale').iterator():
+        groups[(original_condition_id, locale)].append(condition_id)
+    merge_conditions(Condition, groups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0018_translation_memory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='condition',
+            name='normalized_name',
+            field=models.CharField(blank=True, editable=False, max_length=500, null=True, verbose_name='정규화된 이름'),
+        ),
+        migrations.RunPython(deduplicate_conditions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='condition',
+            constraint=models.UniqueConstraint(condition=models.Q(('original_condition__isnull', True)), fields=('normalized_name', 'locale'), name='condition_unique_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='condition',
+            constraint=models.UniqueConstraint(condition=models.Q(('original_condition__isnull', False)), fields=('original_condition', 'locale'), name='condition_unique_translation'),
+        ),
+    ]
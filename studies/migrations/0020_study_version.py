@@ -0,0 +1,105 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:03
+
+from collections import defaultdict
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+CHUNK_SIZE = 500
+# ControlStatusType.COMPLETED
+COMPLETED = '100'
+VERSION_DATA_FIELDS = [
+    'nct_id', 'results_first_submitted_date', 'last_update_submitted_date', 'start_date', 'completion_date',
+    'title', 'overall_status', 'phase', 'enrollment', 'locale',
+]
+
+
+def publish_completed_studies(apps, schema_editor):
+    """
+    적재를 마친 원문 임상 연구와 번역된 임상 연구를 1 번 버전으로 게시한다
+    """
+    Study = apps.get_model('studies', 'Study')
+    StudyVersion = apps.get_model('studies', 'StudyVersion')
+    StudyCondition = apps.get_model('studies', 'Condition').studies.through
+    last_id = 0
+    while True:
+        studies = list(Study.objects.filter(
+            id__gt=last_id, control_status_type=COMPLETED, translate_from_study__isnull=True, clone_from_study__isnull=True,
+        ).order_by('id')[:CHUNK_SIZE])
+        if not studies:
+            break
+        last_id = studies[-1].id
+        study_ids = [study.id for study in studies]
+        translated_studies = defaultdict(list)
+        for translated_study in Study.objects.filter(translate_from_study_id__in=study_ids).order_by('id'):
+            translated_studies[translated_study.translate_from_study_id].append(translated_study)
+        condition_ids = defaultdict(list)
+        for study_id, condition_id in StudyCondition.objects.filter(
+            models.Q(study_id__in=study_ids) | models.Q(study__translate_from_study_id__in=study_ids),
+        ).order_by('id').values_list('study_id', 'condition_id'):
+            condition_ids[study_id].append(condition_id)
+
+        versions = []
+        for study in studies:
+            versions.append(StudyVersion(study_id=study.id, number=1, raw_document_id=study.raw_document_id, original_data_hash=study.original_data_hash, data={
+                published_study.locale: {**{field: getattr(published_study, field) for field in VERSION_DATA_FIELDS}, 'conditions': condition_ids[published_study.id]}
+                for published_study in [study, *translated_studies[study.id]]
+            }))
+        StudyVersion.objects.bulk_create(versions)
+        Study.objects.filter(models.Q(id__in=study_ids) | models.Q(translate_from_study_id__in=study_ids)).update(published_version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0019_condition_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eligibility',
+            name='added_version',
+            field=models.PositiveIntegerField(default=1, verbose_name='추가된 임상연구 버전 번호'),
+        ),
+        migrations.AddField(
+            model_name='eligibility',
+            name='removed_version',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='대체된 임상연구 버전 번호'),
+        ),
+        migrations.AddField(
+            model_name='intervention',
+            name='added_version',
+            field=models.PositiveIntegerField(default=1, verbose_name='추가된 임상연구 버전 번호'),
+        ),
+        migrations.AddField(
+            model_name='intervention',
+            name='removed_version',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='대체된 임상연구 버전 번호'),
+        ),
+        migrations.AddField(
+            model_name='study',
+            name='published_version',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='게시된 버전 번호'),
+        ),
+        migrations.AddField(
+            model_name='study',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='적재 중인 버전 번호'),
+        ),
+        migrations.CreateModel(
+            name='StudyVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='버전 번호')),
+                ('original_data_hash', models.CharField(blank=True, max_length=64, null=True, verbose_name='original_data hash (ORIGINAL_DATA_HASH_ALGORITHM)')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='locale 별 임상연구 필드와 condition 고유번호')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='게시 시각')),
+                ('raw_document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='studies.studyrawdocument', verbose_name='원본 데이터')),
+                ('study', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='studies.study', verbose_name='원문 임상연구(study) 고유번호')),
+            ],
+            options={
+                'unique_together': {('study', 'number')},
+            },
+        ),
+        migrations.RunPython(publish_completed_studies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0020_study_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='study',
+            name='module_hashes',
+            field=models.JSONField(blank=True, null=True, verbose_name='변환(번역)한 original_data 의 module 별 hash'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0021_study_module_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='study',
+            name='failure_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='연속 적재 실패 횟수'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:23
+
+from django.db import migrations, models
+
+from studies.hashing import rehash_raw_documents
+
+
+def rehash(apps, schema_editor):
+    # 원본 문서의 data_hash 를 original_data_hash 와 같은 canonical json hash 로 맞춘다
+    rehash_raw_documents(apps.get_model('studies', 'StudyRawDocument'), apps.get_model('studies', 'Study'), apps.get_model('studies', 'StudyVersion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0022_study_failure_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studyrawdocument',
+            name='data_hash',
+            field=models.CharField(max_length=64, unique=True, verbose_name='data hash (ORIGINAL_DATA_HASH_ALGORITHM)'),
+        ),
+        migrations.RunPython(rehash, migrations.RunPython.noop),
+    ]
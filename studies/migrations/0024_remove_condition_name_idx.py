@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0023_rehash_raw_documents'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='condition',
+            name='condition_name_idx',
+        ),
+    ]
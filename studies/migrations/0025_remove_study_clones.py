@@ -0,0 +1,58 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:29
+
+from django.db import migrations, models
+from django.db.models import F
+
+# ControlStatusType.CONVERT_READY
+CONVERT_READY = '20'
+
+
+def version_cloned_studies(apps, schema_editor):
+    """
+    버전(StudyVersion) 도입 전에 복제되어 적재 중이던 임상 연구는 복제본의 original_data 를 원본 임상 연구의 새 버전으로 옮겨
+    다시 convert, translate 하도록 하고 복제본(번역본, 하위 데이터 포함)은 삭제한다
+    """
+    Study = apps.get_model('studies', 'Study')
+    StudyRawDocument = apps.get_model('studies', 'StudyRawDocument')
+    clones = list(Study.objects.filter(clone_from_study__isnull=False, translate_from_study__isnull=True).values_list('clone_from_study_id', 'raw_document_id', 'original_data_hash'))
+    previous_raw_document_ids = set()
+    for study_id, raw_document_id, original_data_hash in clones:
+        previous_raw_document_ids.update(Study.objects.filter(pk=study_id).values_list('raw_document_id', flat=True))
+        Study.objects.filter(pk=study_id).update(
+            raw_document_id=raw_document_id, original_data_hash=original_data_hash,
+            control_status_type=CONVERT_READY, version=F('version') + 1, failure_count=0,
+        )
+    Study.objects.filter(clone_from_study__isnull=False, translate_from_study__isnull=False).delete()
+    Study.objects.filter(clone_from_study__isnull=False).delete()
+    StudyRawDocument.objects.filter(id__in=previous_raw_document_ids, studies__isnull=True, versions__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studies', '0024_remove_condition_name_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(version_cloned_studies, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='study',
+            name='study_nct_id_idx',
+        ),
+        migrations.RemoveField(
+            model_name='eligibility',
+            name='clone_from_eligibility',
+        ),
+        migrations.RemoveField(
+            model_name='intervention',
+            name='clone_from_intervention',
+        ),
+        migrations.RemoveField(
+            model_name='study',
+            name='clone_from_study',
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=models.Index(fields=['nct_id', 'translate_from_study'], name='study_nct_id_idx'),
+        ),
+    ]
@@ -1,13 +1,57 @@
-from django.db import models, transaction
-from copy import deepcopy
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.utils import timezone
+import hashlib
+
+from .assets import ControlStatusType, WorkUnitStatus
+from .fields import CompressedTextField
+from .hashing import get_original_data_hash
+
+# convert, translate 에 연속으로 이 횟수만큼 실패한 임상 연구는 격리(quarantine)하여 READY 목록에서 제외한다
+STUDY_MAX_FAILURES = getattr(settings, 'STUDY_MAX_FAILURES', 3)
+
+
+class StudyRawDocumentManager(models.Manager):
+    def get_or_create_many(self, datas):
+        """
+        {data_hash: data} 에 해당하는 원본 문서를 한 번에 찾거나 생성하여 {data_hash: StudyRawDocument} 로 반환하는 메소드
+        data_hash 는 호출하는 쪽에서 original_data_hash 로 한 번만 계산한 값을 그대로 사용한다
+        """
+        documents = self.defer('data').in_bulk(datas.keys(), field_name='data_hash')
+        missing_documents = [StudyRawDocument(data_hash=data_hash, data=data) for data_hash, data in datas.items() if data_hash not in documents]
+        if missing_documents:
+            self.bulk_create(missing_documents, ignore_conflicts=True)
+            documents.update(self.defer('data').in_bulk([document.data_hash for document in missing_documents], field_name='data_hash'))
+        return documents
+
+
+class StudyRawDocument(models.Model):
+    data_hash = models.CharField(max_length=64, unique=True, verbose_name="data hash (ORIGINAL_DATA_HASH_ALGORITHM)")
+    data = CompressedTextField(verbose_name="원본 데이터")
+
+    objects = StudyRawDocumentManager()
+
+
+class StudyQuerySet(models.QuerySet):
+    def ready(self, control_status_type):
+        """
+        control_status_type 상태에서 처리를 기다리는 임상 연구 (격리된 임상 연구 제외)
+        """
+        return self.filter(control_status_type=control_status_type, failure_count__lt=STUDY_MAX_FAILURES)
+
+    def quarantined(self):
+        return self.filter(failure_count__gte=STUDY_MAX_FAILURES)
 
-from .assets import ControlStatusType
 
 class Study(models.Model):
     nct_id = models.CharField(verbose_name="임상연구 번호", max_length=50)
     control_status_type = models.CharField(max_length=50, verbose_name="임상연구 적재 상태", null=True, blank=True, choices=ControlStatusType.choices)
-    original_data = models.TextField(verbose_name="원본 데이터", null=True, blank=True)
-    original_data_hash = models.CharField(max_length=64, verbose_name="original_data sha256 hash", null=True, blank=True)
+    raw_document = models.ForeignKey(StudyRawDocument, null=True, blank=True, related_name='studies', verbose_name="원본 데이터", on_delete=models.PROTECT)
+    original_data_hash = models.CharField(max_length=64, verbose_name="original_data hash (ORIGINAL_DATA_HASH_ALGORITHM)", null=True, blank=True)
+    module_hashes = models.JSONField(verbose_name="변환(번역)한 original_data 의 module 별 hash", null=True, blank=True)
     results_first_submitted_date = models.DateField(verbose_name="최초 제출 날짜", null=True, blank=True)
     last_update_submitted_date = models.DateField(verbose_name="최근 수정 날짜", null=True, blank=True)
     start_date = models.DateField(verbose_name="임상연구 시작 날짜", null=True, blank=True)
@@ -17,75 +61,141 @@ class Study(models.Model):
     phase = models.CharField(max_length=50, verbose_name="임상 단계", null=True, blank=True)
     enrollment = models.IntegerField(verbose_name="대상자 수", null=True, blank=True)
     translate_from_study = models.ForeignKey('self', null=True, blank=True, related_name='translated_studies', verbose_name="번역 원본 임상연구(study) 고유번호", on_delete=models.CASCADE)
-    clone_from_study = models.OneToOneField('self', null=True, blank=True, related_name='cloned_study', verbose_name="복제 원본 임상연구(study) 고유번호", on_delete=models.CASCADE)
     locale = models.CharField(max_length=2, verbose_name="언어코드", null=True, blank=True)
+    version = models.PositiveIntegerField(verbose_name="적재 중인 버전 번호", default=1)
+    published_version = models.PositiveIntegerField(verbose_name="게시된 버전 번호", null=True, blank=True)
+    failure_count = models.PositiveIntegerField(verbose_name="연속 적재 실패 횟수", default=0)
 
-    @transaction.atomic
-    def clone(self):
-        cloned_study = self._clone_study()
-        for translated_study in self.translated_studies.all():
-            translated_study._clone_study()
-        return cloned_study
-
-    def _clone_study(self):
-        cloned_study = deepcopy(self)
-        cloned_study.pk = None
-        cloned_study.clone_from_study = self
-        if self.translate_from_study is None:
-            cloned_study.translate_from_study = None
-        else:
-            cloned_study.translate_from_study = self.translate_from_study.cloned_study
-        cloned_study.save()
-
-        for intervention in self.interventions.all():
-            intervention.clone(cloned_study)
-
-        for condition in self.conditions.all():
-            cloned_study.conditions.add(condition)
-        
-        for eligibility in self.eligibilities.all():
-            eligibility.clone(cloned_study)
-        return cloned_study
+    objects = StudyQuerySet.as_manager()
+
+    @property
+    def original_data(self):
+        """
+        원본 데이터는 StudyRawDocument 에 저장되어 있어 처음 접근할 때 조회한다
+        """
+        if '_original_data' in self.__dict__:
+            return self._original_data
+        if self.raw_document_id is None:
+            return None
+        return self.raw_document.data
+
+    @original_data.setter
+    def original_data(self, value):
+        self._original_data = value
 
     def save(self, *args, **kwargs) -> None:
-        if self.control_status_type == ControlStatusType.COMPLETED and self.clone_from_study is not None:
-            clone_from_study_id = self.clone_from_study_id
-            self.translated_studies.all().update(clone_from_study=None)
-            self.clone_from_study = None
-            self.save()
-            Study.objects.filter(id=clone_from_study_id).delete()
-            return
+        if '_original_data' in self.__dict__:
+            original_data = self.__dict__.pop('_original_data')
+            if original_data is None:
+                self.raw_document = None
+            else:
+                data_hash = get_original_data_hash(original_data)
+                self.raw_document = StudyRawDocument.objects.get_or_create_many({data_hash: original_data})[data_hash]
         return super().save(*args, **kwargs)
 
     class Meta:
         unique_together = ('translate_from_study', 'locale')
+        indexes = [
+            models.Index(fields=['nct_id', 'translate_from_study'], name='study_nct_id_idx'),
+            models.Index(fields=['control_status_type', 'id'], name='study_control_status_idx'),
+        ]
 
         
+class VersionedQuerySet(models.QuerySet):
+    """
+    임상 연구 버전 범위(added_version 이상, removed_version 미만)로 저장된 하위 데이터(intervention, eligibility)의 QuerySet
+    """
+    def current(self):
+        """
+        적재 중인 버전의 하위 데이터
+        """
+        return self.filter(removed_version__isnull=True)
+
+    def published(self):
+        """
+        임상 연구의 게시된 버전(published_version)의 하위 데이터
+        """
+        published_version = models.F('study__published_version')
+        return self.filter(models.Q(removed_version__isnull=True) | models.Q(removed_version__gt=published_version), added_version__lte=published_version)
+
+
 class Intervention(models.Model):
     study = models.ForeignKey(Study, on_delete=models.CASCADE, related_name="interventions")
     intervention_type = models.CharField(max_length=500, verbose_name="치료 타입", null=True, blank=True)
     name = models.TextField(null=True, blank=True)
     description = models.TextField(null=True, blank=True)
     translate_from_intervention = models.ForeignKey('self', null=True, blank=True, related_name='translated_interventions', verbose_name="번역 원본 의약품(intervention) 고유번호", on_delete=models.CASCADE)
-    clone_from_intervention = models.OneToOneField('self', null=True, blank=True, related_name='cloned_intervention', verbose_name="복제 원본 의약품(intervention) 고유번호", on_delete=models.CASCADE)
     locale = models.CharField(max_length=2, verbose_name="언어코드", null=True, blank=True)
+    added_version = models.PositiveIntegerField(verbose_name="추가된 임상연구 버전 번호", default=1)
+    removed_version = models.PositiveIntegerField(verbose_name="대체된 임상연구 버전 번호", null=True, blank=True)
+
+    objects = VersionedQuerySet.as_manager()
+
+
+def normalize_condition_name(name):
+    """
+    공백과 대소문자만 다른 condition 이름을 같은 이름으로 취급하기 위한 정규화
+    """
+    if name is None:
+        return None
+    return ' '.join(name.split()).casefold()
+
+
+class ConditionManager(models.Manager):
+    def get_or_create_many(self, conditions):
+        """
+        저장되지 않은 conditions 와 같은 condition(원본은 정규화된 이름과 locale, 번역본은 원본 condition 과 locale 기준)을
+        찾거나 한 번에 생성하여 각 condition 의 pk 를 채우는 메소드
+        unique 제약에 걸리는 condition 은 생성하지 않으므로 여러 작업자가 동시에 호출해도 중복 condition 이 생기지 않는다
+        """
+        all_conditions = conditions = list(conditions)
+        if not conditions:
+            return conditions
+        for condition in conditions:
+            condition.normalized_name = normalize_condition_name(condition.name)
+        # 이름이 없는 원본 condition 은 unique 제약 대상이 아니므로 그대로 생성한다
+        unnamed_conditions = [condition for condition in conditions if condition.original_condition_id is None and condition.normalized_name is None]
+        self.bulk_create(unnamed_conditions)
+        conditions = [condition for condition in conditions if condition not in unnamed_conditions]
+        self.bulk_create(conditions, ignore_conflicts=True)
+        existing_conditions = self.filter(
+            models.Q(original_condition__isnull=True, normalized_name__in={condition.normalized_name for condition in conditions if condition.original_condition_id is None})
+            | models.Q(original_condition__in={condition.original_condition_id for condition in conditions if condition.original_condition_id is not None}),
+        )
+        condition_ids = {condition.get_unique_key(): condition.pk for condition in existing_conditions}
+        for condition in conditions:
+            condition.pk = condition_ids.get(condition.get_unique_key())
+            condition._state.adding, condition._state.db = condition.pk is None, self.db
+        return all_conditions
+
 
-    def clone(self, study):
-        cloned_intervention = deepcopy(self)
-        cloned_intervention.clone_from_intervention = self
-        cloned_intervention.pk = None
-        cloned_intervention.study = study
-        if self.translate_from_intervention is not None:
-            cloned_intervention.translate_from_intervention = self.translate_from_intervention.cloned_intervention
-        cloned_intervention.save()
-        return cloned_intervention
-    
 class Condition(models.Model):
     studies = models.ManyToManyField(Study, related_name="conditions")
     name = models.CharField(max_length=500, null=True, blank=True)
+    normalized_name = models.CharField(max_length=500, verbose_name="정규화된 이름", null=True, blank=True, editable=False)
     original_condition = models.ForeignKey('self', null=True, blank=True, related_name='translated_conditions', verbose_name="원본 질환(condition) 고유번호", on_delete=models.CASCADE)
     locale = models.CharField(max_length=2, verbose_name="언어코드", null=True, blank=True)
-    
+
+    objects = ConditionManager()
+
+    def get_unique_key(self):
+        """
+        unique 제약 기준의 key, 원본은 (정규화된 이름, locale), 번역본은 (원본 condition, locale)
+        """
+        if self.original_condition_id is None:
+            return ('name', normalize_condition_name(self.name), self.locale)
+        return ('original_condition', self.original_condition_id, self.locale)
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_condition_name(self.name)
+        return super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['normalized_name', 'locale'], condition=models.Q(original_condition__isnull=True), name='condition_unique_name'),
+            models.UniqueConstraint(fields=['original_condition', 'locale'], condition=models.Q(original_condition__isnull=False), name='condition_unique_translation'),
+        ]
+
 class Eligibility(models.Model):
     study = models.ForeignKey(Study, on_delete=models.CASCADE, related_name="eligibilities")
     gender = models.TextField(verbose_name="성별", null=True, blank=True)
@@ -94,23 +204,201 @@ class Eligibility(models.Model):
     healthy_volunteers = models.TextField(null=True, blank=True)
     criteria = models.TextField(null=True, blank=True)
     translate_from_eligibility = models.ForeignKey('self', null=True, blank=True, related_name='translated_eligibilities', verbose_name="번역 원본 선정조건(eligibility) 고유번호", on_delete=models.CASCADE)
-    clone_from_eligibility = models.OneToOneField('self', null=True, blank=True, related_name='cloned_eligibility', verbose_name="복제 원본 선정조건(eligibility) 고유번호", on_delete=models.CASCADE)
     locale = models.CharField(max_length=2, verbose_name="언어코드", null=True, blank=True)
+    added_version = models.PositiveIntegerField(verbose_name="추가된 임상연구 버전 번호", default=1)
+    removed_version = models.PositiveIntegerField(verbose_name="대체된 임상연구 버전 번호", null=True, blank=True)
 
-    def clone(self, study):
-        cloned_eligibility = deepcopy(self)
-        cloned_eligibility.pk = None
-        cloned_eligibility.study = study
-        cloned_eligibility.clone_from_eligibility = self
-        if self.translate_from_eligibility is not None:
-            cloned_eligibility.translate_from_eligibility = self.translate_from_eligibility.cloned_eligibility
-        cloned_eligibility.save()
-        return cloned_eligibility
-        
-                
-            
+    objects = VersionedQuerySet.as_manager()
+
+
+# 게시된 버전에 저장하는 임상 연구 필드 (하위 데이터는 버전 범위로 저장한다)
+VERSION_DATA_FIELDS = [
+    'nct_id', 'results_first_submitted_date', 'last_update_submitted_date', 'start_date', 'completion_date',
+    'title', 'overall_status', 'phase', 'enrollment', 'locale',
+]
+
+
+class StudyVersionManager(models.Manager):
+    def publish(self, study):
+        """
+        원문 임상 연구(study)의 적재 중인 버전(study.version)을 게시하는 메소드
+        임상 연구 필드와 condition 을 버전으로 추가한 뒤 원문, 번역된 임상 연구의 published_version 을 UPDATE 한 번으로 바꾼다
+        버전은 추가만 하고, 이전 버전과 하위 데이터는 prune 으로 정리할 때까지 남긴다
+        """
+        studies = [study, *Study.objects.filter(translate_from_study=study)]
+        study_ids = [study.pk for study in studies]
+        condition_ids = defaultdict(list)
+        for study_id, condition_id in Condition.studies.through.objects.filter(study_id__in=study_ids).order_by('id').values_list('study_id', 'condition_id'):
+            condition_ids[study_id].append(condition_id)
+        data = {
+            translated_study.locale: {**{field: getattr(translated_study, field) for field in VERSION_DATA_FIELDS}, 'conditions': condition_ids[translated_study.pk]}
+            for translated_study in studies
+        }
+        version, _ = self.update_or_create(study=study, number=study.version, defaults={
+            'raw_document_id': study.raw_document_id,
+            'original_data_hash': study.original_data_hash,
+            'data': data,
+        })
+        Study.objects.filter(pk__in=study_ids).update(published_version=study.version)
+        study.published_version = study.version
+        return version
+
+    def prune(self, keep):
+        """
+        임상 연구마다 최근 keep 개의 버전만 남기고, 이전 버전과 남긴 버전에서 조회되지 않는 하위 데이터, 원본 문서를 삭제한 뒤 삭제한 버전 개수를 반환하는 메소드
+        """
+        numbers = defaultdict(list)
+        for study_id, number in self.order_by('study_id', '-number').values_list('study_id', 'number'):
+            numbers[study_id].append(number)
+        pruned_versions_num = 0
+        for study_id, study_numbers in numbers.items():
+            if len(study_numbers) <= keep:
+                continue
+            oldest_number = study_numbers[keep - 1]
+            study_ids = [study_id, *Study.objects.filter(translate_from_study_id=study_id).values_list('id', flat=True)]
+            with transaction.atomic():
+                for model in (Intervention, Eligibility):
+                    model.objects.filter(study_id__in=study_ids, removed_version__lte=oldest_number).delete()
+                previous_versions = self.filter(study_id=study_id, number__lt=oldest_number)
+                raw_document_ids = set(previous_versions.values_list('raw_document_id', flat=True))
+                pruned_versions_num += previous_versions.delete()[0]
+                StudyRawDocument.objects.filter(id__in=raw_document_ids, studies__isnull=True, versions__isnull=True).delete()
+        return pruned_versions_num
+
+
+class StudyVersion(models.Model):
+    """
+    원문 임상 연구의 게시된 버전
+
+    적재를 마친 버전마다 한 행을 추가하고, 임상 연구의 published_version 이 가리키는 버전이 게시된 데이터이다
+    임상 연구 필드와 condition 은 data 에 locale 별로, 하위 데이터(intervention, eligibility)는 바뀐 행만 버전 범위로 저장한다
+    """
+    study = models.ForeignKey(Study, related_name='versions', verbose_name="원문 임상연구(study) 고유번호", on_delete=models.CASCADE)
+    number = models.PositiveIntegerField(verbose_name="버전 번호")
+    raw_document = models.ForeignKey(StudyRawDocument, null=True, blank=True, related_name='versions', verbose_name="원본 데이터", on_delete=models.PROTECT)
+    original_data_hash = models.CharField(max_length=64, verbose_name="original_data hash (ORIGINAL_DATA_HASH_ALGORITHM)", null=True, blank=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="locale 별 임상연구 필드와 condition 고유번호")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="게시 시각")
+
+    objects = StudyVersionManager()
+
+    class Meta:
+        unique_together = ('study', 'number')
 
 
 class ConfigurationVariable(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="변수명")
-    value = models.CharField(max_length=100, verbose_name="값")
\ No newline at end of file
+    value = models.CharField(max_length=100, verbose_name="값")
+
+
+class TranslationMemory(models.Model):
+    """
+    번역한 문장을 원문 hash 와 번역 언어 기준으로 저장하여 같은 원문을 다시 번역하지 않도록 하는 번역 메모리
+    """
+    source_hash = models.CharField(max_length=64, verbose_name="원문 sha256 hash")
+    locale = models.CharField(max_length=2, verbose_name="언어코드")
+    source_text = models.TextField(verbose_name="원문")
+    translated_text = models.TextField(verbose_name="번역문")
+
+    @staticmethod
+    def get_source_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    class Meta:
+        unique_together = ('source_hash', 'locale')
+
+
+class WorkUnitManager(models.Manager):
+    def plan(self, task, get_ranges):
+        """
+        task 의 작업 단위가 모두 끝났거나 없으면 이전 작업 단위를 지우고 get_ranges() 범위로 새 작업 단위를 만드는 메소드
+        task 마다 계획 행(ConfigurationVariable)을 SELECT ... FOR UPDATE 로 잠근 채 확인부터 생성까지 진행하므로,
+        여러 host 가 동시에 계획해도 한 host 만 계획하고 다른 host 가 할당받은 작업 단위를 지우지 않는다
+        (select_for_update 가 동작하지 않는 sqlite 는 호출하는 쪽의 write lock 과 쓰기 transaction 으로 직렬화된다)
+        """
+        plan_name = f'work_unit_plan:{task}'
+        ConfigurationVariable.objects.get_or_create(name=plan_name, defaults={'value': ''})
+        with transaction.atomic():
+            plan = ConfigurationVariable.objects.select_for_update().get(name=plan_name)
+            if self.filter(task=task, status__in=[WorkUnitStatus.PENDING, WorkUnitStatus.CLAIMED]).exists():
+                return
+            ranges = list(get_ranges())
+            self.filter(task=task).delete()
+            self.bulk_create([WorkUnit(task=task, start=start, end=end) for start, end in ranges], ignore_conflicts=True)
+            plan.value = timezone.now().isoformat()
+            plan.save(update_fields=['value'])
+
+    def claimable(self, task):
+        return self.filter(
+            models.Q(status=WorkUnitStatus.PENDING) | models.Q(status=WorkUnitStatus.CLAIMED, lease_expires_at__lt=timezone.now()),
+            task=task,
+        ).order_by('start')
+
+    def claim(self, task, owner, lease_seconds):
+        """
+        task 의 작업 단위 하나를 owner 에게 lease_seconds 동안 할당하여 반환하는 메소드 (할당할 작업 단위가 없으면 None)
+        postgresql 은 SELECT ... FOR UPDATE SKIP LOCKED 로, skip locked 를 지원하지 않는 sqlite 는
+        조회한 status, lease 가 그대로일 때만 update 하는 compare-and-swap 으로 다른 작업자와 겹치지 않게 할당한다
+        """
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                work_unit = self.claimable(task).select_for_update(skip_locked=True).first()
+                if work_unit is not None:
+                    work_unit.lease(owner, lease_seconds)
+                return work_unit
+        while True:
+            work_units = list(self.claimable(task)[:10])
+            if not work_units:
+                return None
+            for work_unit in work_units:
+                if work_unit.lease(owner, lease_seconds):
+                    return work_unit
+
+
+class WorkUnit(models.Model):
+    """
+    여러 작업자(process, host)가 나누어 처리하는 작업 단위 (rank 범위 또는 READY 임상연구 id 범위)
+    """
+    task = models.CharField(max_length=50, verbose_name="작업 이름")
+    start = models.IntegerField(verbose_name="범위 시작")
+    end = models.IntegerField(verbose_name="범위 끝")
+    status = models.CharField(max_length=50, verbose_name="작업 상태", choices=WorkUnitStatus.choices, default=WorkUnitStatus.PENDING)
+    owner = models.CharField(max_length=200, verbose_name="작업자", null=True, blank=True)
+    lease_expires_at = models.DateTimeField(verbose_name="할당 만료 시각", null=True, blank=True)
+    attempts = models.IntegerField(verbose_name="할당 횟수", default=0)
+
+    objects = WorkUnitManager()
+
+    def lease(self, owner, lease_seconds):
+        """
+        조회한 뒤 다른 작업자가 할당받지 않았을 때만 owner 에게 할당하는 메소드
+        """
+        lease_expires_at = timezone.now() + timedelta(seconds=lease_seconds)
+        leased = WorkUnit.objects.filter(pk=self.pk, status=self.status, lease_expires_at=self.lease_expires_at).update(
+            status=WorkUnitStatus.CLAIMED,
+            owner=owner,
+            lease_expires_at=lease_expires_at,
+            attempts=models.F('attempts') + 1,
+        )
+        if leased:
+            self.status, self.owner, self.lease_expires_at, self.attempts = WorkUnitStatus.CLAIMED, owner, lease_expires_at, self.attempts + 1
+        return bool(leased)
+
+    def heartbeat(self, lease_seconds):
+        """
+        할당을 연장하고, 할당이 만료되어 다른 작업자가 가져갔다면 False 를 반환하는 메소드
+        """
+        lease_expires_at = timezone.now() + timedelta(seconds=lease_seconds)
+        extended = WorkUnit.objects.filter(pk=self.pk, owner=self.owner, status=WorkUnitStatus.CLAIMED).update(lease_expires_at=lease_expires_at)
+        if extended:
+            self.lease_expires_at = lease_expires_at
+        return bool(extended)
+
+    def finish(self, status):
+        return bool(WorkUnit.objects.filter(pk=self.pk, owner=self.owner, status=WorkUnitStatus.CLAIMED).update(status=status, lease_expires_at=None))
+
+    class Meta:
+        unique_together = ('task', 'start', 'end')
+        indexes = [
+            models.Index(fields=['task', 'status', 'start'], name='work_unit_claim_idx'),
+        ]
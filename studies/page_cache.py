@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import os
+import shutil
+from datetime import date, timedelta
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+CACHE_DIR = getattr(settings, 'CLINICALTRIALS_PAGE_CACHE_DIR', None)
+
+
+class PageCache:
+    """
+    clinicaltrials.gov 응답 원문을 gzip 으로 압축해 저장하는 content-addressed 캐시
+
+    objects/<sha256[:2]>/<sha256>.json.gz 에 응답 원문을 한 번만 저장하고,
+    pages/<fetch date>/<key> 에는 해당 날짜에 받은 응답의 sha256 을 기록한다
+    응답은 항상 기록하지만, 캐시에서 읽는 것은 replay, resume 모드에서만 한다
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.replay_date = None
+        self.resuming = False
+
+    @property
+    def replaying(self):
+        return self.replay_date is not None
+
+    def fetch_date(self):
+        return self.replay_date or date.today().isoformat()
+
+    def _object_path(self, digest):
+        return self.directory / 'objects' / digest[:2] / f'{digest}.json.gz'
+
+    def _page_path(self, key, fetch_date):
+        return self.directory / 'pages' / fetch_date / key
+
+    def _write(self, path, content):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=path.parent, delete=False) as file:
+            file.write(content)
+        os.replace(file.name, path)
+
+    def get(self, key):
+        page_path = self._page_path(key, self.fetch_date())
+        if not page_path.exists():
+            return None
+        with gzip.open(self._object_path(page_path.read_text()), 'rb') as file:
+            return file.read()
+
+    def put(self, key, content):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        if not object_path.exists():
+            self._write(object_path, gzip.compress(content))
+        self._write(self._page_path(key, self.fetch_date()), digest.encode('ascii'))
+
+    def replay(self, replay_date=None):
+        """
+        replay_date(기본값: 가장 최근 날짜)에 캐시된 응답만 사용하도록 전환하는 메소드
+        """
+        pages_directory = self.directory / 'pages'
+        fetch_dates = sorted(path.name for path in pages_directory.iterdir()) if pages_directory.is_dir() else []
+        if replay_date is None:
+            if not fetch_dates:
+                raise ValidationError(f'{self.directory} 에 캐시된 페이지 없음')
+            replay_date = fetch_dates[-1]
+        elif replay_date not in fetch_dates:
+            raise ValidationError(f'{replay_date} 에 캐시된 페이지 없음')
+        self.replay_date = replay_date
+
+    def resume(self):
+        """
+        오늘 캐시된 페이지는 캐시에서 읽고, 없는 페이지만 요청하도록 전환하는 메소드
+        """
+        self.resuming = True
+
+    def prune(self, keep_days):
+        """
+        keep_days 일보다 오래된 pages/<fetch date> 를 지우고, 남은 날짜에서 참조하지 않는 objects 를 지우는 메소드
+        """
+        pages_directory = self.directory / 'pages'
+        if not pages_directory.exists():
+            return 0
+        oldest_kept_date = (date.today() - timedelta(days=keep_days)).isoformat()
+        for fetch_directory in pages_directory.iterdir():
+            if fetch_directory.name < oldest_kept_date:
+                shutil.rmtree(fetch_directory)
+        referenced_digests = {page_path.read_text() for page_path in pages_directory.glob('*/*')}
+        pruned_objects_num = 0
+        for object_path in self.directory.glob('objects/*/*.json.gz'):
+            if object_path.name.split('.')[0] not in referenced_digests:
+                object_path.unlink()
+                pruned_objects_num += 1
+        return pruned_objects_num
+
+
+page_cache = PageCache(CACHE_DIR) if CACHE_DIR is not None else None
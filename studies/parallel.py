@@ -0,0 +1,92 @@
+import fcntl
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+import django
+from django.db import connection, connections
+from tqdm import tqdm
+
+# 작업 process 에서 DB 쓰기를 직렬화하는 lock (sqlite 가 아니면 None)
+worker_write_lock = None
+
+
+def iter_pk_ranges(queryset, chunk_size):
+    """
+    queryset 을 pk 순서로 chunk_size 개씩 나눈 (first_pk, last_pk) 범위를 keyset pagination 으로 반환하는 메소드
+    """
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk') if last_pk is None else queryset.filter(pk__gt=last_pk).order_by('pk')
+        pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        yield pks[0], last_pk
+
+
+class FileLock:
+    """
+    같은 sqlite DB 를 쓰는 모든 process(다른 command 실행 포함)가 함께 쓰는 lock 파일
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def use_sqlite_file_lock():
+    """
+    sqlite 이면 DB 파일 옆의 lock 파일로 DB 쓰기를 직렬화하도록 설정하는 메소드
+    """
+    global worker_write_lock
+    if connection.vendor == 'sqlite' and worker_write_lock is None:
+        worker_write_lock = FileLock(f"{connection.settings_dict['NAME']}.lock")
+
+
+def get_write_lock():
+    return worker_write_lock or nullcontext()
+
+
+def init_worker(write_lock):
+    """
+    작업 process 마다 django 를 초기화하고 부모 process 의 DB 연결을 쓰지 않도록 닫는 메소드
+    """
+    global worker_write_lock
+    django.setup()
+    connections.close_all()
+    worker_write_lock = write_lock
+
+
+def run_sharded(func, pk_ranges, total, workers=1):
+    """
+    pk_ranges 의 각 범위를 func(first_pk, last_pk) 로 처리하는 메소드
+    workers 가 2 이상이면 process pool 에서 범위별로 나누어 처리하고,
+    func 가 반환한 처리 개수를 부모 process 에서 합쳐 진행률을 표시한다
+    """
+    with tqdm(total=total) as progress_bar:
+        if workers <= 1:
+            for first_pk, last_pk in pk_ranges:
+                progress_bar.update(func(first_pk, last_pk))
+            return
+
+        # 작업 process 가 부모 process 의 DB 연결을 이어받지 않도록 범위를 모두 구한 뒤 연결을 닫고 pool 을 만든다
+        pk_ranges = list(pk_ranges)
+        connections.close_all()
+        context = multiprocessing.get_context()
+        write_lock = context.Lock() if connection.vendor == 'sqlite' else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(write_lock,)) as executor:
+            futures = [executor.submit(func, first_pk, last_pk) for first_pk, last_pk in pk_ranges]
+            try:
+                for future in as_completed(futures):
+                    progress_bar.update(future.result())
+            finally:
+                for future in futures:
+                    future.cancel()
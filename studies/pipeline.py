@@ -0,0 +1,175 @@
+import traceback
+from contextlib import nullcontext
+from queue import Queue
+from threading import Event, Lock, Thread
+from django.conf import settings
+from django.db import connection
+from tqdm import tqdm
+
+from .batch_tasks import save_converted_study, save_translated_study, store_studies
+from .clinicaltrials import get_studies_num, iter_studies_pages
+from .condition_cache import condition_cache
+from .models import ConfigurationVariable
+from .translation_backends import get_backend
+
+QUEUE_SIZE = getattr(settings, 'PIPELINE_QUEUE_SIZE', 200)
+CONVERT_WORKERS = getattr(settings, 'PIPELINE_CONVERT_WORKERS', 1)
+TRANSLATE_WORKERS = getattr(settings, 'PIPELINE_TRANSLATE_WORKERS', None)
+
+STOP = object()
+
+
+class Stage:
+    """
+    input_queue 에서 작업을 꺼내 처리하고 결과를 output_queue 로 넘기는 파이프라인 단계
+    """
+    def __init__(self, name, func, workers, input_queue, output_queue, aborted, position, write_lock=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.aborted = aborted
+        self.write_lock = write_lock
+        self.downstream_workers = 0
+        self.progress_bar = tqdm(desc=name, unit='study', position=position)
+        self.exception = None
+        self._running_workers = workers
+        self._lock = Lock()
+        self._threads = [Thread(target=self._run, name=f'{name}-{i}', daemon=True) for i in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        self.progress_bar.close()
+
+    def put(self, item):
+        if self.output_queue is not None and item is not None:
+            self.output_queue.put(item)
+
+    def size(self, item):
+        return 1
+
+    def process(self, item):
+        try:
+            with self.write_lock or nullcontext():
+                result = self.func(item)
+            self.put(result)
+        except Exception:
+            traceback.print_exc()
+
+    def _run(self):
+        try:
+            while True:
+                item = self.input_queue.get()
+                if item is STOP:
+                    break
+                if not self.aborted.is_set():
+                    self.process(item)
+                self.progress_bar.update(self.size(item))
+        finally:
+            connection.close()
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._running_workers -= 1
+            if self._running_workers > 0:
+                return
+        if self.output_queue is not None:
+            for _ in range(self.downstream_workers):
+                self.output_queue.put(STOP)
+
+
+class FetchStage(Stage):
+    """
+    clinicaltrials.gov 페이지를 가져와 다음 단계에 넘기는 단계
+    """
+    def __init__(self, starts, output_queue, aborted, position):
+        self.starts = starts
+        super().__init__('fetch', None, 1, None, output_queue, aborted, position)
+
+    def _run(self):
+        try:
+            for studies in iter_studies_pages(self.starts):
+                if self.aborted.is_set():
+                    return
+                self.output_queue.put(studies)
+                self.progress_bar.update(len(studies))
+        except Exception as e:
+            self.exception = e
+            self.aborted.set()
+        finally:
+            self._finish()
+
+
+class StoreStage(Stage):
+    """
+    페이지 단위로 original_data를 저장하는 단계, 저장 순서대로 적재 진행 상황(configuration_name)을 기록한다
+    """
+    def __init__(self, only_new, configuration_name, loaded_studies_num, input_queue, output_queue, aborted, position, write_lock):
+        self.configuration_name = configuration_name
+        self.loaded_studies_num = loaded_studies_num
+        super().__init__('store', lambda studies: store_studies(studies, only_new=only_new), 1, input_queue, output_queue, aborted, position, write_lock)
+
+    def put(self, stored_studies):
+        for study in stored_studies or []:
+            super().put(study)
+
+    def size(self, studies):
+        return len(studies)
+
+    def process(self, studies):
+        """
+        페이지를 저장한 뒤에만 적재 진행 상황을 올리는 메소드
+        저장에 실패하면 파이프라인을 중단하여 다음 실행이 같은 페이지부터 다시 적재하게 한다
+        """
+        try:
+            with self.write_lock or nullcontext():
+                stored_studies = self.func(studies)
+        except Exception as e:
+            self.exception = e
+            self.aborted.set()
+            return
+        self.put(stored_studies)
+        self.loaded_studies_num += len(studies)
+        with self.write_lock or nullcontext():
+            ConfigurationVariable.objects.filter(name=self.configuration_name).update(value=self.loaded_studies_num)
+
+
+def save_studies_pipelined(only_new=False):
+    """
+    fetch, store, convert, translate 단계를 bounded queue 로 연결하여 동시에 실행하는 메소드
+    """
+    configuration_name = 'loaded_new_studies_num' if only_new else 'loaded_studies_num'
+    studies_num = get_studies_num()
+    loaded_studies_num = int(ConfigurationVariable.objects.get_or_create(name=configuration_name, defaults={'value': 1})[0].value)
+
+    # convert, translate 단계는 transaction 안에서 condition 을 찾으므로 시작 전에 condition LRU 를 채운다
+    condition_cache.warm()
+    aborted = Event()
+    # sqlite 는 동시에 하나의 쓰기 transaction 만 허용하므로 DB 쓰기를 직렬화한다
+    write_lock = Lock() if connection.vendor == 'sqlite' else None
+    # store_queue 에는 100개 단위의 페이지가 들어간다
+    store_queue, convert_queue, translate_queue = Queue(max(1, QUEUE_SIZE // 100)), Queue(QUEUE_SIZE), Queue(QUEUE_SIZE)
+    stages = [
+        FetchStage(range(loaded_studies_num, studies_num, 100), store_queue, aborted, 0),
+        StoreStage(only_new, configuration_name, loaded_studies_num, store_queue, convert_queue, aborted, 1, write_lock),
+        Stage('convert', lambda study: save_converted_study(study) or study, CONVERT_WORKERS, convert_queue, translate_queue, aborted, 2, write_lock),
+        Stage('translate', lambda study: save_translated_study(study, write_lock), TRANSLATE_WORKERS or get_backend().max_concurrency, translate_queue, None, aborted, 3),
+    ]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.downstream_workers = next_stage.workers
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+
+    for stage in stages:
+        if stage.exception is not None:
+            raise stage.exception
+    ConfigurationVariable.objects.filter(name=configuration_name).update(value=1)
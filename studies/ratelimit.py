@@ -0,0 +1,42 @@
+from threading import Lock
+from time import monotonic, sleep
+
+
+class RateLimiter:
+    """
+    여러 worker가 공유하는 token bucket 방식의 요청 제한기
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated_at = monotonic()
+        self._paused_until = 0
+        self._lock = Lock()
+
+    def acquire(self):
+        """
+        token을 하나 얻을 때까지 대기하는 메소드
+        """
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                    self._updated_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Retry-After 등으로 요청이 거부되었을 때 모든 worker의 요청을 seconds 동안 멈추는 메소드
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic() + seconds)
@@ -1,3 +1,506 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from tempfile import TemporaryDirectory
+from unittest import mock
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
 
-# Create your tests here.
+from .assets import ControlStatusType, WorkUnitStatus
+from .clinicaltrials import fetch_json, get_retry_after
+from .condition_cache import condition_cache
+from .hashing import CONVERT_MODULES, encode_original_data, get_changed_modules, get_module_hashes, get_original_data_hash
+from .batch_tasks import record_failures, save_converted_studies, save_new_studies, save_translated_studies, save_updated_studies
+from .models import STUDY_MAX_FAILURES, Condition, Intervention, Study, StudyRawDocument, StudyVersion, WorkUnit
+from .page_cache import PageCache
+from .ratelimit import RateLimiter
+from .translation import split_segments, translate_many
+from .translation_memory import translation_memory
+from .writers import save_study
+
+CRITERIA = """Inclusion Criteria:
+
+  * Adults aged 18 or older. Written consent (signed) is required.
+  * Diagnosed with type 2 diabetes;  HbA1c 7% or higher
+     1. Stable dose for 3 months
+
+Exclusion Criteria:
+
+- Pregnancy
+• Prior insulin use.  """
+
+
+def intervention_items(study):
+    return [{'id': intervention.pk, 'name': intervention.name} for intervention in Intervention.objects.current().filter(study=study).order_by('id')]
+
+
+class SaveStudyTests(TestCase):
+    """
+    writers.save_study 의 하위 데이터 비교 저장과 검증
+    """
+    def setUp(self):
+        self.study = save_study({
+            'nct_id': 'NCT00000001',
+            'locale': 'en',
+            'interventions': [{'name': 'Drug A'}, {'name': 'Drug B'}],
+        })
+
+    def test_updates_creates_and_deletes_interventions_of_unpublished_study(self):
+        drug_a, drug_b = intervention_items(self.study)
+        save_study({'interventions': [{'id': drug_a['id'], 'name': 'Drug A2'}, {'name': 'Drug C'}]}, self.study)
+
+        interventions = list(Intervention.objects.filter(study=self.study).order_by('id').values_list('id', 'name', 'removed_version'))
+        self.assertEqual(interventions[0], (drug_a['id'], 'Drug A2', None))
+        self.assertEqual([name for _, name, _ in interventions[1:]], ['Drug C'])
+        self.assertFalse(Intervention.objects.filter(pk=drug_b['id']).exists())
+
+    def test_keeps_published_interventions_and_marks_them_removed(self):
+        Study.objects.filter(pk=self.study.pk).update(published_version=1, version=2)
+        self.study.refresh_from_db()
+        drug_a, drug_b = intervention_items(self.study)
+        save_study({'interventions': [{'id': drug_a['id'], 'name': 'Drug A2'}]}, self.study)
+
+        self.assertEqual(Intervention.objects.get(pk=drug_a['id']).removed_version, 2)
+        self.assertEqual(Intervention.objects.get(pk=drug_b['id']).removed_version, 2)
+        self.assertEqual(list(Intervention.objects.current().filter(study=self.study).values_list('name', 'added_version')), [('Drug A2', 2)])
+        self.assertEqual(sorted(Intervention.objects.published().filter(study=self.study).values_list('name', flat=True)), ['Drug A', 'Drug B'])
+
+    def test_unchanged_interventions_are_not_rewritten(self):
+        items = intervention_items(self.study)
+        with self.assertNumQueries(3):
+            save_study({'interventions': items}, self.study)
+        self.assertEqual(intervention_items(self.study), items)
+
+    def test_links_shared_conditions_without_renaming_them(self):
+        other_study = save_study({'nct_id': 'NCT00000002', 'locale': 'en', 'conditions': [{'name': 'Diabetes', 'locale': 'en'}]})
+        condition = other_study.conditions.get()
+        save_study({'conditions': [{'id': condition.pk, 'name': 'diabetes', 'locale': 'en'}, {'name': ' DIABETES ', 'locale': 'en'}]}, self.study)
+
+        self.assertEqual(list(self.study.conditions.values_list('id', flat=True)), [condition.pk])
+        self.assertEqual(Condition.objects.get().name, 'Diabetes')
+
+    def test_rejects_missing_related_rows(self):
+        with self.assertRaises(ValidationError) as context:
+            save_study({'interventions': [{'name': 'Drug A', 'translate_from_intervention': 999999}]}, self.study)
+        self.assertIn('translate_from_intervention', context.exception.detail)
+        self.assertEqual(Intervention.objects.filter(study=self.study).count(), 2)
+
+        with self.assertRaises(ValidationError):
+            save_study({'conditions': [{'name': 'Diabetes', 'locale': 'ko', 'original_condition': 999999}]}, self.study)
+        self.assertFalse(Condition.objects.exists())
+
+    def test_rejects_invalid_field_values(self):
+        with self.assertRaises(ValidationError) as context:
+            save_study({'control_status_type': 'unknown'}, self.study)
+        self.assertIn('control_status_type', context.exception.detail)
+        with self.assertRaises(ValidationError):
+            save_study({'interventions': [{'name': 'Drug A', 'locale': 'toolong'}]}, self.study)
+
+
+def fake_translation(text, locale):
+    return '\n'.join(f'[{locale}]{line}' for line in text.split('\n'))
+
+
+class TranslationTests(TestCase):
+    """
+    문장 단위 번역(split_segments, translate_many)이 원문의 줄바꿈, 목록 기호, 공백을 그대로 유지하는지 검증
+    """
+    def setUp(self):
+        translation_memory.clear()
+        self.addCleanup(translation_memory.clear)
+
+    def test_split_segments_round_trips(self):
+        for text in (CRITERIA, '', 'One line', '\n\n  trailing  \n', '1) First. 2) Second!'):
+            self.assertEqual(''.join(part for _, part in split_segments(text)), text)
+
+    def test_split_segments_translates_only_sentences(self):
+        segments = [part for is_segment, part in split_segments('  * Adults aged 18 or older. Written consent (signed) is required.  ') if is_segment]
+        self.assertEqual(segments, ['Adults aged 18 or older.', 'Written consent (signed) is required.'])
+
+    def test_translate_many_keeps_layout(self):
+        with mock.patch('studies.translation.request_translation', side_effect=lambda text, locale: text):
+            self.assertEqual(translate_many([CRITERIA, None]), {CRITERIA: CRITERIA})
+
+        translation_memory.clear()
+        with mock.patch('studies.translation.request_translation', side_effect=fake_translation):
+            translated_text = translate_many([CRITERIA])[CRITERIA]
+        expected_text = CRITERIA
+        for is_segment, part in split_segments(CRITERIA):
+            if is_segment:
+                expected_text = expected_text.replace(part, f'[ko]{part}', 1)
+        self.assertEqual(translated_text, expected_text)
+
+    def test_translate_many_translates_each_sentence_once(self):
+        with mock.patch('studies.translation.request_translation', side_effect=fake_translation) as request_translation:
+            translations = translate_many(['Pregnancy', '* Pregnancy\n* Prior insulin use.'])
+            translate_many(['Pregnancy'])
+        self.assertEqual(translations, {'Pregnancy': '[ko]Pregnancy', '* Pregnancy\n* Prior insulin use.': '* [ko]Pregnancy\n* [ko]Prior insulin use.'})
+        self.assertEqual(request_translation.call_count, 1)
+
+    def test_translate_many_splits_sentences_longer_than_request_limit(self):
+        long_sentence = ' '.join(['Participants must not have received any investigational drug'] * 10) + '.'
+        long_word = '가' * 200
+        self.assertGreater(len(long_sentence.encode('utf-8')), 500)
+        with mock.patch('studies.translation.request_translation', side_effect=fake_translation) as request_translation:
+            translations = translate_many([long_sentence, long_word])
+
+        requested_texts = [call.args[0] for call in request_translation.call_args_list]
+        self.assertTrue(all(len(text.encode('utf-8')) <= 500 for text in requested_texts))
+        self.assertEqual(translations[long_sentence].replace('[ko]', ''), long_sentence)
+        self.assertEqual(translations[long_word], '[ko]' + '가' * 166 + '[ko]' + '가' * 34)
+        self.assertEqual(translation_memory.get_many([long_sentence], 'ko'), {long_sentence: translations[long_sentence]})
+
+    def test_untranslated_sentence_leaves_text_untranslated(self):
+        with mock.patch('studies.translation.request_translation', side_effect=lambda text, locale: None):
+            self.assertEqual(translate_many(['Pregnancy. Prior insulin use.']), {'Pregnancy. Prior insulin use.': None})
+
+
+def make_original_data(interventions, title='Title', conditions=('Diabetes',), nct_id='NCT00000001'):
+    return {'Study': {'ProtocolSection': {
+        'IdentificationModule': {'NCTId': nct_id},
+        'DescriptionModule': {'OfficialTitle': title, 'OverallStatus': 'Recruiting', 'Phase': 'Phase 1'},
+        'ArmsInterventionsModule': {'InterventionList': {'Intervention': [
+            {'InterventionName': name, 'InterventionType': 'Drug'} for name in interventions
+        ]}},
+        'ConditionsModule': {'ConditionList': {'Condition': list(conditions)}},
+        'EligibilityModule': {'Gender': 'All', 'EligibilityCriteria': 'Adults'},
+    }}}
+
+
+@mock.patch('studies.translation.request_translation', side_effect=fake_translation)
+class StudyVersionTests(TestCase):
+    """
+    업데이트된 임상 연구를 같은 행에서 새 버전으로 적재하고 게시(StudyVersion.objects.publish)하는 과정 검증
+    """
+    def setUp(self):
+        translation_memory.clear()
+        self.addCleanup(translation_memory.clear)
+
+    def load(self, studies):
+        save_translated_studies(save_converted_studies(studies))
+
+    def get_study(self):
+        return Study.objects.get(nct_id='NCT00000001', locale='en')
+
+    def test_new_study_is_published_as_version_1(self, request_translation):
+        self.load(save_new_studies([make_original_data(['Drug A'])]))
+
+        study = self.get_study()
+        translated_study = study.translated_studies.get()
+        self.assertEqual((study.version, study.published_version, translated_study.published_version), (1, 1, 1))
+        version = StudyVersion.objects.get(study=study)
+        self.assertEqual(version.number, 1)
+        self.assertEqual(version.data['en']['title'], 'Title')
+        self.assertEqual(version.data['ko']['title'], '[ko]Title')
+        self.assertEqual(version.data['en']['conditions'], list(study.conditions.values_list('id', flat=True)))
+
+    def test_update_bumps_version_in_place_and_keeps_published_rows(self, request_translation):
+        self.load(save_new_studies([make_original_data(['Drug A', 'Drug B'])]))
+        study_ids = set(Study.objects.values_list('id', flat=True))
+
+        converted_studies = save_updated_studies([make_original_data(['Drug A', 'Drug C'])])
+        study = self.get_study()
+        self.assertEqual(converted_studies, [study])
+        self.assertEqual((study.version, study.published_version, study.control_status_type), (2, 1, str(ControlStatusType.CONVERT_READY)))
+
+        save_converted_studies(converted_studies)
+        interventions = Intervention.objects.filter(study=study)
+        self.assertEqual(sorted(interventions.values_list('name', 'added_version', 'removed_version')), [('Drug A', 1, None), ('Drug B', 1, 2), ('Drug C', 2, None)])
+        self.assertEqual(sorted(interventions.published().values_list('name', flat=True)), ['Drug A', 'Drug B'])
+        self.assertEqual(sorted(interventions.current().values_list('name', flat=True)), ['Drug A', 'Drug C'])
+
+        save_translated_studies([self.get_study()])
+        study = self.get_study()
+        self.assertEqual(set(Study.objects.values_list('id', flat=True)), study_ids)
+        self.assertEqual(set(Study.objects.values_list('published_version', flat=True)), {2})
+        self.assertEqual(sorted(Intervention.objects.published().filter(study__translate_from_study=study).values_list('name', flat=True)), ['[ko]Drug A', '[ko]Drug C'])
+        self.assertEqual(sorted(StudyVersion.objects.filter(study=study).values_list('number', flat=True)), [1, 2])
+
+    def test_unconverted_change_does_not_bump_version(self, request_translation):
+        self.load(save_new_studies([make_original_data(['Drug A'])]))
+        original_data = make_original_data(['Drug A'])
+        original_data['Study']['ProtocolSection']['ContactsLocationsModule'] = {'LocationList': {}}
+
+        self.assertEqual(save_updated_studies([original_data]), [])
+        study = self.get_study()
+        self.assertEqual((study.version, study.control_status_type), (1, str(ControlStatusType.COMPLETED)))
+        self.assertEqual(StudyVersion.objects.get(study=study).raw_document_id, study.raw_document_id)
+
+    def test_update_during_convert_or_translate_supersedes_stale_study(self, request_translation):
+        self.load(save_new_studies([make_original_data(['Drug A'])]))
+        converting_studies = save_updated_studies([make_original_data(['Drug B'])])
+        converting_studies[0].raw_document.data
+        translating_studies = save_converted_studies([self.get_study()])
+        # 변환, 번역하는 동안 새 버전이 적재된다
+        save_converted_studies(save_updated_studies([make_original_data(['Drug C'])]))
+        study = self.get_study()
+
+        self.assertEqual(save_converted_studies(converting_studies), [])
+        self.assertEqual(save_translated_studies(translating_studies), [])
+        record_failures(converting_studies + translating_studies, [])
+        stale_study = self.get_study()
+        self.assertEqual(
+            (stale_study.version, stale_study.published_version, stale_study.control_status_type, stale_study.raw_document_id, stale_study.failure_count),
+            (3, 1, str(ControlStatusType.TRANSLATE_READY), study.raw_document_id, 0),
+        )
+        self.assertEqual(sorted(Intervention.objects.current().filter(study=study).values_list('name', flat=True)), ['Drug C'])
+
+    def test_publish_keeps_previous_versions(self, request_translation):
+        self.load(save_new_studies([make_original_data(['Drug A'])]))
+        study = self.get_study()
+        Study.objects.filter(pk=study.pk).update(version=2, title='Title 2')
+        Intervention.objects.filter(study=study).update(removed_version=2)
+        study.refresh_from_db()
+
+        version = StudyVersion.objects.publish(study)
+
+        self.assertEqual((version.number, version.data['en']['title']), (2, 'Title 2'))
+        self.assertEqual(dict(StudyVersion.objects.filter(study=study).values_list('number', 'data__en__title')), {1: 'Title', 2: 'Title 2'})
+        self.assertEqual(set(Study.objects.values_list('published_version', flat=True)), {2})
+        self.assertEqual(list(Intervention.objects.filter(study=study).values_list('name', 'removed_version')), [('Drug A', 2)])
+
+    def test_prune_keeps_recent_versions(self, request_translation):
+        self.load(save_new_studies([make_original_data(['Drug A'])]))
+        for title, interventions in (('Title 2', ['Drug B']), ('Title 3', ['Drug C'])):
+            self.load(save_updated_studies([make_original_data(interventions, title)]))
+        study = self.get_study()
+        first_raw_document_id = StudyVersion.objects.get(study=study, number=1).raw_document_id
+
+        self.assertEqual(StudyVersion.objects.prune(2), 1)
+        self.assertEqual(StudyVersion.objects.prune(2), 0)
+
+        self.assertEqual(sorted(StudyVersion.objects.filter(study=study).values_list('number', flat=True)), [2, 3])
+        self.assertFalse(StudyRawDocument.objects.filter(pk=first_raw_document_id).exists())
+        # 남긴 버전(2)에서 조회되는 하위 데이터는 남긴다
+        self.assertEqual(sorted(Intervention.objects.filter(study=study).values_list('name', 'added_version', 'removed_version')), [('Drug B', 2, 3), ('Drug C', 3, None)])
+        self.assertEqual(sorted(Intervention.objects.published().filter(study__translate_from_study=study).values_list('name', flat=True)), ['[ko]Drug C'])
+
+@mock.patch('studies.translation.request_translation', side_effect=fake_translation)
+class ConditionCacheTests(TransactionTestCase):
+    """
+    transaction 안에서 저장하는 convert, translate 단계가 condition LRU 를 사용하는지 검증
+    """
+    def setUp(self):
+        for cache in (translation_memory, condition_cache):
+            cache.clear()
+            self.addCleanup(cache.clear)
+
+    def test_translate_looks_up_each_new_condition_once(self, request_translation):
+        studies = save_new_studies([make_original_data(['Drug A'], conditions=('Diabetes', 'Obesity'), nct_id=f'NCT0000000{i}') for i in range(1, 4)])
+        studies = save_converted_studies(studies)
+        condition_cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(len(save_translated_studies(studies)), 3)
+        # 첫 임상 연구가 만든 번역된 condition 은 commit 뒤 LRU 에 들어가 나머지 임상 연구는 조회하지 않는다
+        lookups = [query['sql'] for query in context.captured_queries if 'WHERE "studies_condition"."original_condition_id" IN' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(Condition.objects.filter(locale='ko').count(), 2)
+
+
+class RehashMigrationTests(TransactionTestCase):
+    """
+    0023_rehash_raw_documents 가 임상 연구 json 이 아닌 원본 문서를 건너뛰고 참조하는 임상 연구를 다시 받도록 하는지 검증
+    """
+    migrate_from = [('studies', '0022_study_failure_count')]
+    migrate_to = [('studies', '0023_rehash_raw_documents')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_skips_documents_that_are_not_original_data(self):
+        apps = self.migrate(self.migrate_from)
+        StudyRawDocument, OldStudy = apps.get_model('studies', 'StudyRawDocument'), apps.get_model('studies', 'Study')
+        original_data = make_original_data(['Drug A'])
+        # 이전 save_new_study_original_datas 는 원본 문서 대신 hash 를 저장했다
+        hash_document = StudyRawDocument.objects.create(data_hash='a' * 64, data=get_original_data_hash(original_data))
+        document = StudyRawDocument.objects.create(data_hash='b' * 64, data=json.dumps(original_data, indent=2))
+        OldStudy.objects.create(nct_id='NCT00000001', locale='en', raw_document=hash_document, original_data_hash='a' * 64, control_status_type=ControlStatusType.TRANSLATE_READY)
+        OldStudy.objects.create(nct_id='NCT00000002', locale='en', raw_document=document, original_data_hash='b' * 64, control_status_type=ControlStatusType.CONVERT_READY)
+
+        apps = self.migrate(self.migrate_to)
+        NewStudy = apps.get_model('studies', 'Study')
+
+        reset_study, rehashed_study = NewStudy.objects.order_by('nct_id')
+        self.assertEqual((reset_study.raw_document_id, reset_study.original_data_hash, reset_study.control_status_type), (hash_document.id, None, str(ControlStatusType.CONVERT_READY)))
+        self.assertEqual(rehashed_study.original_data_hash, get_original_data_hash(original_data))
+        self.assertEqual(apps.get_model('studies', 'StudyRawDocument').objects.get(pk=document.pk).data, encode_original_data(original_data))
+
+
+class RateLimiterTests(SimpleTestCase):
+    """
+    clinicaltrials.gov 요청 제한(RateLimiter)과 Retry-After 헤더 해석 검증
+    """
+    def setUp(self):
+        self.now, self.waits = 100.0, []
+        for patcher in (
+            mock.patch('studies.ratelimit.monotonic', side_effect=lambda: self.now),
+            mock.patch('studies.ratelimit.sleep', side_effect=self.sleep),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds):
+        self.waits.append(seconds)
+        self.now += seconds
+
+    def test_acquire_waits_when_bucket_is_empty(self):
+        rate_limiter = RateLimiter(2)
+        for _ in range(3):
+            rate_limiter.acquire()
+        self.assertEqual(self.waits, [0.5])
+
+        self.now += 10
+        for _ in range(2):
+            rate_limiter.acquire()
+        self.assertEqual(self.waits, [0.5])
+
+    def test_pause_delays_every_request(self):
+        rate_limiter = RateLimiter(2)
+        rate_limiter.pause(30)
+        rate_limiter.pause(5)
+        rate_limiter.acquire()
+        self.assertEqual(self.waits, [30])
+
+    def test_get_retry_after(self):
+        def response(retry_after=None):
+            return mock.Mock(headers={} if retry_after is None else {'Retry-After': retry_after})
+
+        self.assertEqual(get_retry_after(response(), 60), 60)
+        self.assertEqual(get_retry_after(response('120'), 60), 120)
+        self.assertEqual(get_retry_after(response('soon'), 60), 60)
+        self.assertAlmostEqual(get_retry_after(response(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)), 60), 30, delta=2)
+        self.assertEqual(get_retry_after(response(format_datetime(datetime.now(timezone.utc) - timedelta(days=1), usegmt=True)), 60), 0)
+
+
+class PageCacheTests(SimpleTestCase):
+    """
+    clinicaltrials.gov 응답 캐시(PageCache)의 replay, resume 모드 검증
+    """
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.page_cache = PageCache(self.directory)
+        for patcher in (
+            mock.patch('studies.clinicaltrials.page_cache', self.page_cache),
+            mock.patch('studies.clinicaltrials.request', side_effect=lambda url, params: mock.Mock(content=json.dumps(params).encode())),
+        ):
+            self.request = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_replay_reads_pages_of_latest_or_given_date(self):
+        self.page_cache.replay_date = '2020-01-01'
+        self.page_cache.put('page', b'old')
+        self.page_cache.replay_date = None
+        self.page_cache.put('page', b'new')
+
+        page_cache = PageCache(self.directory)
+        page_cache.replay()
+        self.assertEqual(page_cache.get('page'), b'new')
+        page_cache.replay('2020-01-01')
+        self.assertEqual(page_cache.get('page'), b'old')
+        with self.assertRaises(ValidationError):
+            page_cache.replay('2019-01-01')
+        with self.assertRaises(ValidationError):
+            PageCache(f'{self.directory}/missing').replay()
+
+    def test_fetch_json_reads_cache_only_when_resuming_or_replaying(self):
+        self.assertEqual(fetch_json('url', {'page': 1}, 'page'), {'page': 1})
+        self.assertEqual(fetch_json('url', {'page': 1}, 'count', resumable=False), {'page': 1})
+        self.assertEqual(fetch_json('url', {'page': 2}, 'page'), {'page': 2})
+        self.assertEqual(self.request.call_count, 3)
+
+        self.page_cache.resume()
+        self.assertEqual(fetch_json('url', {'page': 3}, 'page'), {'page': 2})
+        self.assertEqual(fetch_json('url', {'page': 3}, 'count', resumable=False), {'page': 3})
+        self.assertEqual(self.request.call_count, 4)
+
+        self.page_cache.replay()
+        self.assertEqual(fetch_json('url', {'page': 4}, 'count', resumable=False), {'page': 3})
+        with self.assertRaises(ValidationError):
+            fetch_json('url', {'page': 4}, 'missing')
+        self.assertEqual(self.request.call_count, 4)
+
+
+class ModuleHashTests(SimpleTestCase):
+    """
+    convert 단계에서 읽는 module 의 변경 감지(get_module_hashes, get_changed_modules) 검증
+    """
+    def test_detects_changed_and_removed_modules(self):
+        original_data = make_original_data(['Drug A'])
+        module_hashes = get_module_hashes(original_data)
+        self.assertEqual(list(module_hashes), CONVERT_MODULES)
+        self.assertEqual(get_changed_modules(module_hashes, None), CONVERT_MODULES)
+        self.assertEqual(get_changed_modules(module_hashes, module_hashes), [])
+
+        original_data['Study']['ProtocolSection']['ContactsLocationsModule'] = {'LocationList': {}}
+        self.assertEqual(get_changed_modules(get_module_hashes(original_data), module_hashes), [])
+        original_data['Study']['ProtocolSection']['DescriptionModule']['OfficialTitle'] = 'Title 2'
+        del original_data['Study']['ProtocolSection']['ConditionsModule']
+        changed_module_hashes = get_module_hashes(original_data)
+        self.assertIsNone(changed_module_hashes['ConditionsModule'])
+        self.assertEqual(get_changed_modules(changed_module_hashes, module_hashes), ['DescriptionModule', 'ConditionsModule'])
+
+
+class WorkUnitTests(TestCase):
+    """
+    작업 단위(WorkUnit) 할당, 할당 연장, 할당 만료 뒤 다른 작업자의 재할당 검증
+    """
+    def setUp(self):
+        WorkUnit.objects.plan('convert', lambda: [(1, 10), (11, 20)])
+
+    def test_claim_assigns_each_work_unit_once(self):
+        first, second = WorkUnit.objects.claim('convert', 'A', 600), WorkUnit.objects.claim('convert', 'B', 600)
+        self.assertEqual([(first.start, first.owner), (second.start, second.owner)], [(1, 'A'), (11, 'B')])
+        self.assertIsNone(WorkUnit.objects.claim('convert', 'C', 600))
+
+        # 할당된 작업 단위가 남아 있으면 다시 계획하지 않는다
+        WorkUnit.objects.plan('convert', lambda: [(1, 5)])
+        self.assertEqual(WorkUnit.objects.filter(task='convert').count(), 2)
+        self.assertTrue(first.finish(WorkUnitStatus.DONE))
+        self.assertTrue(second.finish(WorkUnitStatus.DONE))
+        WorkUnit.objects.plan('convert', lambda: [(1, 5)])
+        self.assertEqual(list(WorkUnit.objects.filter(task='convert').values_list('start', 'end', 'status')), [(1, 5, str(WorkUnitStatus.PENDING))])
+
+    def test_expired_lease_is_claimed_by_another_owner(self):
+        work_unit = WorkUnit.objects.claim('convert', 'A', 600)
+        self.assertTrue(work_unit.heartbeat(600))
+        WorkUnit.objects.filter(pk=work_unit.pk).update(lease_expires_at=work_unit.lease_expires_at - timedelta(seconds=601))
+
+        reclaimed_work_unit = WorkUnit.objects.claim('convert', 'B', 600)
+        self.assertEqual((reclaimed_work_unit.pk, reclaimed_work_unit.owner, reclaimed_work_unit.attempts), (work_unit.pk, 'B', 2))
+        self.assertFalse(work_unit.heartbeat(600))
+        self.assertFalse(work_unit.finish(WorkUnitStatus.DONE))
+        self.assertTrue(reclaimed_work_unit.finish(WorkUnitStatus.DONE))
+
+
+class QuarantineTests(TestCase):
+    """
+    연속으로 실패한 임상 연구의 격리(Study.objects.ready, quarantined)와 해제 검증
+    """
+    def test_failing_study_is_quarantined_until_saved_or_updated(self):
+        study = save_new_studies([make_original_data(['Drug A'])])[0]
+        for _ in range(STUDY_MAX_FAILURES - 1):
+            record_failures([study], [])
+        self.assertEqual(list(Study.objects.ready(ControlStatusType.CONVERT_READY)), [study])
+
+        record_failures([study], [])
+        self.assertEqual(list(Study.objects.ready(ControlStatusType.CONVERT_READY)), [])
+        self.assertEqual(list(Study.objects.quarantined()), [study])
+
+        # 원본 데이터가 바뀌면 다시 처리한다
+        save_updated_studies([make_original_data(['Drug B'])])
+        self.assertEqual(list(Study.objects.ready(ControlStatusType.CONVERT_READY)), [study])
+        record_failures([study], [])
+        record_failures([study], [study])
+        self.assertEqual(Study.objects.get(pk=study.pk).failure_count, 0)
@@ -0,0 +1,170 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from .translation_backends import get_backend
+from .translation_memory import translation_memory
+
+# 여러 원문을 한 번의 요청으로 번역할 때 원문 사이에 넣는 구분자
+SEPARATOR = '\n'
+
+# 줄 앞의 들여쓰기, 목록 기호(*, -, •, 1., 1)) 와 줄 끝 공백
+LINE_PATTERN = re.compile(r'^(\s*(?:(?:[*\-•]|\d+[.)])\s+)?)(.*?)(\s*)$')
+# 문장 끝(. ! ? ;) 뒤의 공백, 다음 문장은 대문자, 숫자, 여는 괄호로 시작한다
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?;])(\s+)(?=[A-Z0-9(])')
+WHITESPACE_PATTERN = re.compile(r'(\s+)')
+
+
+def request_translation(text, locale):
+    return get_backend().request(text, locale)
+
+
+def get_byte_length(text):
+    return len(text.encode('utf-8'))
+
+
+def pack_texts(texts, max_length=None):
+    """
+    원문 목록을 구분자로 이었을 때 UTF-8 byte 길이가 max_length(기본값: 번역 backend 의 max_batch_length)를 넘지 않도록 묶은 목록을 반환하는 메소드
+    구분자가 들어 있거나 max_length 보다 긴 원문은 따로 요청한다
+    """
+    max_length = max_length or get_backend().max_batch_length
+    packs, pack, pack_length = [], [], 0
+    for text in texts:
+        text_length = get_byte_length(text)
+        if SEPARATOR in text or text_length > max_length:
+            packs.append([text])
+            continue
+        if pack and pack_length + len(SEPARATOR) + text_length > max_length:
+            packs.append(pack)
+            pack, pack_length = [], 0
+        pack_length += text_length + (len(SEPARATOR) if pack else 0)
+        pack.append(text)
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def translate_pack(pack, locale):
+    """
+    묶인 원문을 한 번에 번역하여 원문 순서대로 반환하는 메소드
+    번역 결과를 원문 개수대로 나눌 수 없으면 원문을 하나씩 번역한다
+    """
+    if len(pack) == 1:
+        return [request_translation(pack[0], locale)]
+    translated_texts = request_translation(SEPARATOR.join(pack), locale)
+    if translated_texts is not None:
+        translated_texts = translated_texts.split(SEPARATOR)
+        if len(translated_texts) == len(pack):
+            return translated_texts
+    return [request_translation(text, locale) for text in pack]
+
+
+def translate_packs(packs, locale):
+    """
+    묶인 원문들을 번역 backend 의 max_concurrency 개 thread 에서 동시에 번역하여 ([(pack, 번역 결과)], [예외]) 로 반환하는 메소드
+    번역에 실패한 pack 이 있어도 나머지 pack 의 번역 결과는 버리지 않고 packs 순서대로 반환한다
+    """
+    results, errors = [], []
+    workers = min(get_backend().max_concurrency, len(packs))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [(pack, executor.submit(translate_pack, pack, locale)) for pack in packs]
+        for pack, future in futures:
+            try:
+                results.append((pack, future.result()))
+            except Exception as e:
+                errors.append(e)
+    return results, errors
+
+
+def split_segments(text):
+    """
+    원문을 번역할 문장(segment)과 그대로 둘 부분(줄바꿈, 들여쓰기, 목록 기호, 문장 사이 공백)으로 나누어
+    [(번역 여부, 문자열)] 로 반환하는 메소드, 문자열을 모두 이으면 원문이 된다
+    """
+    parts = []
+    for line_number, line in enumerate(text.split('\n')):
+        if line_number > 0:
+            parts.append((False, '\n'))
+        prefix, content, suffix = LINE_PATTERN.match(line).groups()
+        parts.append((False, prefix))
+        for index, part in enumerate(SENTENCE_BOUNDARY_PATTERN.split(content)):
+            # split 결과의 홀수 번째는 문장 사이 공백이다
+            parts.append((index % 2 == 0 and part != '', part))
+        parts.append((False, suffix))
+    return [(is_segment, part) for is_segment, part in parts if part]
+
+
+def split_long_segment(segment, max_length):
+    """
+    UTF-8 byte 길이가 max_length 보다 긴 문장을 공백에서, 공백 없이 긴 부분은 글자 단위로 잘라
+    max_length 이하의 조각과 그대로 둘 공백 [(번역 여부, 문자열)] 로 반환하는 메소드, 문자열을 모두 이으면 문장이 된다
+    """
+    parts, chunk = [], ''
+    words = WHITESPACE_PATTERN.split(segment)
+    for index in range(0, len(words), 2):
+        space, word = words[index - 1] if index > 0 else '', words[index]
+        if chunk and get_byte_length(chunk + space + word) <= max_length:
+            chunk += space + word
+            continue
+        if chunk:
+            parts.append((True, chunk))
+        if space:
+            parts.append((False, space))
+        chunk = ''
+        for character in word:
+            if get_byte_length(chunk + character) > max_length:
+                parts.append((True, chunk))
+                chunk = ''
+            chunk += character
+    if chunk:
+        parts.append((True, chunk))
+    return parts
+
+
+def translate_segments(segments, locale):
+    """
+    문장 목록을 번역하여 {문장: 번역문} 으로 반환하는 메소드
+    중복과 번역 메모리에 있는 문장을 제외한 문장만 최대한 적은 수의 요청으로 묶어 동시에 번역한다
+    요청 길이 제한(max_batch_length)보다 긴 문장은 split_long_segment 로 나눈 조각을 번역한 뒤 다시 합친다
+    번역에 실패한 요청이 있으면 성공한 요청의 번역문을 번역 메모리에 넣은 뒤 예외를 다시 발생시킨다
+    """
+    segments = list(dict.fromkeys(segments))
+    translations = translation_memory.get_many(segments, locale)
+    max_length = get_backend().max_batch_length
+    long_segments = {
+        segment: split_long_segment(segment, max_length) for segment in segments
+        if segment not in translations and get_byte_length(segment) > max_length
+    }
+    chunks = list(dict.fromkeys(part for parts in long_segments.values() for is_segment, part in parts if is_segment))
+    translations.update(translation_memory.get_many([chunk for chunk in chunks if chunk not in translations], locale))
+    untranslated_segments = list(dict.fromkeys(
+        segment for segment in segments + chunks if segment not in translations and segment not in long_segments
+    ))
+    results, errors = translate_packs(pack_texts(untranslated_segments, max_length), locale)
+    for pack, translated_segments in results:
+        for segment, translated_segment in zip(pack, translated_segments):
+            if translated_segment is not None:
+                translation_memory.put(segment, locale, translated_segment)
+            translations[segment] = translated_segment
+    if errors:
+        raise errors[0]
+    for segment, parts in long_segments.items():
+        translated_parts = [translations[part] if is_segment else part for is_segment, part in parts]
+        translations[segment] = None if None in translated_parts else ''.join(translated_parts)
+        if translations[segment] is not None:
+            translation_memory.put(segment, locale, translations[segment])
+    return translations
+
+
+def translate_many(texts, locale='ko'):
+    """
+    여러 원문을 번역하여 {원문: 번역문} 으로 반환하는 메소드
+    원문을 문장 단위로 나누어 처음 보는 문장만 번역하고 원문의 줄바꿈, 목록 기호를 유지한 채 다시 합친다
+    문장 하나라도 번역하지 못한 원문의 번역문은 None 이다
+    """
+    split_texts = {text: split_segments(text) for text in texts if text is not None}
+    translations = translate_segments([part for parts in split_texts.values() for is_segment, part in parts if is_segment], locale)
+    translated_texts = {}
+    for text, parts in split_texts.items():
+        translated_parts = [translations[part] if is_segment else part for is_segment, part in parts]
+        translated_texts[text] = None if None in translated_parts else ''.join(translated_parts)
+    return translated_texts
@@ -0,0 +1,135 @@
+import json
+import time
+from threading import BoundedSemaphore, local
+from django.conf import settings
+from django.utils.module_loading import import_string
+from translate import Translator
+from translate.translate import TRANSLATION_API_MAX_LENGTH
+
+from .ratelimit import RateLimiter
+
+
+class TranslationBackend:
+    """
+    번역 backend 의 기본 class
+
+    max_concurrency 는 동시에 보낼 수 있는 요청 수, max_batch_length 는 요청 하나에 담을 수 있는 원문 길이(UTF-8 byte),
+    requests_per_second 는 초당 요청 수 제한(None 이면 제한 없음)으로, 번역 단계는 이 값에 맞춰 요청을 묶고 동시에 보낸다
+    """
+    max_concurrency = 1
+    max_batch_length = TRANSLATION_API_MAX_LENGTH
+    requests_per_second = None
+
+    def __init__(self, max_concurrency=None, max_batch_length=None, requests_per_second=None):
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        if max_batch_length is not None:
+            self.max_batch_length = max_batch_length
+        if requests_per_second is not None:
+            self.requests_per_second = requests_per_second
+        self.rate_limiter = RateLimiter(self.requests_per_second or 0)
+        self._semaphore = BoundedSemaphore(self.max_concurrency)
+
+    def request(self, text, locale):
+        """
+        process 전체에서 동시에 max_concurrency 개, 초당 requests_per_second 개까지만 번역을 요청하는 메소드
+        """
+        with self._semaphore:
+            self.rate_limiter.acquire()
+            return self.translate(text, locale)
+
+    def translate(self, text, locale):
+        raise NotImplementedError
+
+
+class TranslatePackageBackend(TranslationBackend):
+    """
+    translate 패키지의 번역 provider(mymemory, microsoft, deepl, libre, yandex)를 사용하는 backend
+    """
+    max_concurrency = 2
+    requests_per_second = 5
+    # 기본 provider 인 MyMemory 는 500 byte 보다 긴 원문(q)을 거부한다
+    provider_max_batch_lengths = {'mymemory': 500}
+
+    def __init__(self, provider=None, secret_access_key=None, **kwargs):
+        super().__init__(**kwargs)
+        if kwargs.get('max_batch_length') is None:
+            self.max_batch_length = self.provider_max_batch_lengths.get(provider or 'mymemory', self.max_batch_length)
+        self.provider = provider
+        self.secret_access_key = secret_access_key
+        self._translators = local()
+
+    def get_translator(self, locale):
+        """
+        thread 마다 locale 별 Translator 를 한 번만 만들어 재사용하는 메소드
+        """
+        translators = self._translators.__dict__.setdefault('translators', {})
+        if locale not in translators:
+            translators[locale] = Translator(to_lang=locale, provider=self.provider, secret_access_key=self.secret_access_key)
+        return translators[locale]
+
+    def translate(self, text, locale):
+        return self.get_translator(locale).translate(text)
+
+
+class LocalBackend(TranslationBackend):
+    """
+    네트워크 요청 없이 줄 단위로 사전(dictionary)에 있는 번역문을, 없으면 원문을 그대로 반환하는 offline backend
+    dictionary_path 는 {locale: {원문: 번역문}} 형식의 json 파일
+    """
+    max_concurrency = 8
+    max_batch_length = 100000
+
+    def __init__(self, dictionary=None, dictionary_path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.dictionary = dict(dictionary or {})
+        if dictionary_path is not None:
+            with open(dictionary_path, encoding='utf-8') as file:
+                self.dictionary.update(json.load(file))
+
+    def translate(self, text, locale):
+        dictionary = self.dictionary.get(locale, {})
+        return '\n'.join(dictionary.get(line, line) for line in text.split('\n'))
+
+
+class LatencyStubBackend(TranslationBackend):
+    """
+    요청마다 latency 초를 기다린 뒤 원문 앞에 [locale] 을 붙여 반환하는 부하 테스트용 backend
+    """
+    max_concurrency = 8
+
+    def __init__(self, latency=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def translate(self, text, locale):
+        time.sleep(self.latency)
+        return '\n'.join(f'[{locale}]{line}' for line in text.split('\n'))
+
+
+BACKENDS = {
+    'translate': TranslatePackageBackend,
+    'local': LocalBackend,
+    'stub': LatencyStubBackend,
+}
+
+_backend = None
+
+
+def load_backend(config):
+    """
+    {'BACKEND': 이름 또는 class 경로, 'OPTIONS': {...}} 설정으로 번역 backend 를 만드는 메소드
+    """
+    backend_class = config.get('BACKEND', 'translate')
+    backend_class = BACKENDS[backend_class] if backend_class in BACKENDS else import_string(backend_class)
+    return backend_class(**config.get('OPTIONS', {}))
+
+
+def get_backend():
+    """
+    TRANSLATION_BACKEND 설정의 번역 backend 를 process 에서 한 번만 만들어 반환하는 메소드
+    """
+    global _backend
+    if _backend is None:
+        _backend = load_backend(getattr(settings, 'TRANSLATION_BACKEND', {}))
+    return _backend
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+
+from .models import TranslationMemory
+
+LRU_SIZE = getattr(settings, 'TRANSLATION_MEMORY_LRU_SIZE', 10000)
+
+
+class TranslationMemoryCache:
+    """
+    TranslationMemory 테이블 앞에 process 내부 LRU 를 둔 번역 메모리
+
+    새로 번역한 문장은 바로 저장하지 않고 모아 두었다가 flush() 에서 한 번에 저장한다
+    (pipeline 에서는 번역을 DB 쓰기 lock 밖에서 하므로 저장은 lock 안의 flush() 에서 한다)
+    """
+    def __init__(self, maxsize=LRU_SIZE):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = Lock()
+
+    def _remember(self, key, translated_text):
+        self._cache[key] = translated_text
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def get_many(self, texts, locale):
+        """
+        번역 메모리에 있는 원문을 {원문: 번역문} 으로 반환하는 메소드, LRU 에 없는 원문은 쿼리 한 번으로 조회한다
+        """
+        translations, missing_texts = {}, {}
+        with self._lock:
+            for text in texts:
+                key = (text, locale)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    translations[text] = self._cache[key]
+                elif key in self._pending:
+                    translations[text] = self._pending[key]
+                else:
+                    missing_texts[TranslationMemory.get_source_hash(text)] = text
+        if not missing_texts:
+            return translations
+        memories = TranslationMemory.objects.filter(source_hash__in=missing_texts.keys(), locale=locale)
+        with self._lock:
+            for memory in memories:
+                text = missing_texts[memory.source_hash]
+                if memory.source_text == text:
+                    self._remember((text, locale), memory.translated_text)
+                    translations[text] = memory.translated_text
+        return translations
+
+    def put(self, text, locale, translated_text):
+        with self._lock:
+            self._remember((text, locale), translated_text)
+            self._pending[(text, locale)] = translated_text
+
+    def flush(self):
+        """
+        새로 번역한 문장을 TranslationMemory 테이블에 한 번에 저장하는 메소드
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        TranslationMemory.objects.bulk_create([
+            TranslationMemory(source_hash=TranslationMemory.get_source_hash(text), locale=locale, source_text=text, translated_text=translated_text)
+            for (text, locale), translated_text in pending.items()
+        ], ignore_conflicts=True)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._pending.clear()
+
+
+translation_memory = TranslationMemoryCache()
@@ -0,0 +1,122 @@
+import os
+import socket
+import traceback
+from threading import Event, Thread
+from django.conf import settings
+from django.db import DatabaseError, connection
+from tqdm import tqdm
+
+from .assets import ControlStatusType, WorkUnitStatus
+from .batch_tasks import (
+    CONVERT_BATCH_SIZE, TRANSLATE_BATCH_SIZE, convert_studies_range, get_rank_ranges, load_new_studies, load_studies,
+    save_new_studies, save_updated_studies, sync_updated_studies, translate_studies_range,
+)
+from .clinicaltrials import get_studies
+from .models import Study, WorkUnit
+from .parallel import get_write_lock, iter_pk_ranges, use_sqlite_file_lock
+
+LEASE_SECONDS = getattr(settings, 'WORK_UNIT_LEASE_SECONDS', 600)
+MAX_ATTEMPTS = getattr(settings, 'WORK_UNIT_MAX_ATTEMPTS', 3)
+
+
+def get_ready_pk_ranges(control_status_type, chunk_size):
+    return iter_pk_ranges(Study.objects.ready(control_status_type), chunk_size)
+
+
+def process_rank_range(store, locked=True):
+    """
+    rank 범위의 임상 연구를 받아와 store 로 저장하는 작업 단위 처리 함수를 반환하는 메소드
+    locked 이면 store(studies) 전체를 write_lock 안에서 실행하고,
+    아니면 번역 요청처럼 오래 걸리는 작업 동안 다른 작업자가 쓸 수 있도록 store(studies, write_lock) 가 저장할 때만 write_lock 을 잡는다
+    """
+    def process(start, end):
+        studies = get_studies(start, end)
+        if locked:
+            with get_write_lock():
+                store(studies)
+        else:
+            store(studies, get_write_lock())
+    return process
+
+
+# task 이름: (작업 단위 처리 함수 func(start, end), 작업 단위 범위 목록을 만드는 함수)
+TASKS = {
+    'save_all_studies': (process_rank_range(load_studies, locked=False), get_rank_ranges),
+    'save_all_new_studies': (process_rank_range(load_new_studies, locked=False), get_rank_ranges),
+    'save_new_original_data': (process_rank_range(save_new_studies), get_rank_ranges),
+    'update_original_data': (process_rank_range(save_updated_studies), get_rank_ranges),
+    'convert': (convert_studies_range, lambda: get_ready_pk_ranges(ControlStatusType.CONVERT_READY, CONVERT_BATCH_SIZE)),
+    'translate': (translate_studies_range, lambda: get_ready_pk_ranges(ControlStatusType.TRANSLATE_READY, TRANSLATE_BATCH_SIZE)),
+    # 작업 단위가 하나뿐이므로 이미 실행 중인 동기화가 있으면 할당받지 못하고 종료한다
+    'sync_updated_studies': (lambda start, end: sync_updated_studies(get_write_lock()), lambda: [(1, 1)]),
+}
+
+
+def get_owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Heartbeat:
+    """
+    작업 단위를 처리하는 동안 lease_seconds / 3 마다 할당을 연장하는 thread
+    """
+    def __init__(self, work_unit, lease_seconds):
+        self.work_unit = work_unit
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, name=f'heartbeat-{work_unit.pk}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.lease_seconds / 3):
+                try:
+                    if not self.work_unit.heartbeat(self.lease_seconds):
+                        self.lost = True
+                        return
+                except DatabaseError:
+                    # sqlite 에서 다른 쓰기와 겹치면 다음 주기에 다시 연장한다
+                    traceback.print_exc()
+        finally:
+            connection.close()
+
+
+def process_work_units(task):
+    """
+    task 의 작업 단위를 할당받아 처리하는 메소드, 더 이상 할당받을 작업 단위가 없으면 종료한다
+    여러 process, host 에서 동시에 실행해도 같은 작업 단위를 중복으로 처리하지 않는다
+    """
+    func, get_ranges = TASKS[task]
+    use_sqlite_file_lock()
+    with get_write_lock():
+        WorkUnit.objects.plan(task, get_ranges)
+    owner = get_owner()
+    total = WorkUnit.objects.filter(task=task).count()
+    done = WorkUnit.objects.filter(task=task, status__in=[WorkUnitStatus.DONE, WorkUnitStatus.FAILED]).count()
+    with tqdm(total=total, initial=done, desc=task, unit='unit') as progress_bar:
+        while True:
+            with get_write_lock():
+                work_unit = WorkUnit.objects.claim(task, owner, LEASE_SECONDS)
+            if work_unit is None:
+                return
+            try:
+                with Heartbeat(work_unit, LEASE_SECONDS) as heartbeat:
+                    func(work_unit.start, work_unit.end)
+            except Exception:
+                traceback.print_exc()
+                with get_write_lock():
+                    work_unit.finish(WorkUnitStatus.FAILED if work_unit.attempts >= MAX_ATTEMPTS else WorkUnitStatus.PENDING)
+                continue
+            with get_write_lock():
+                finished = work_unit.finish(WorkUnitStatus.DONE)
+            if heartbeat.lost or not finished:
+                tqdm.write(f'{task} [{work_unit.start}, {work_unit.end}] 작업 단위의 할당이 만료되어 다른 작업자가 가져갔습니다')
+            progress_bar.update(1)
@@ -0,0 +1,182 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+
+from .condition_cache import condition_cache
+from .models import Study, Intervention, Condition, Eligibility
+from .serializers import InterventionSerializer, ConditionSerializer, EligibilitySerializer
+
+STUDY_FIELDS = [field.name for field in Study._meta.concrete_fields if not field.primary_key and field.name not in ('raw_document', 'original_data_hash', 'published_version', 'failure_count')]
+
+# StudySerializer 의 nested serializer 와 같은 필드를 저장한다
+REVERSE_RELATIONS = {
+    'interventions': (Intervention, InterventionSerializer.Meta.fields),
+    'eligibilities': (Eligibility, EligibilitySerializer.Meta.fields),
+}
+CONDITION_FIELDS = ConditionSerializer.Meta.fields
+
+
+def _set_fields(instance, data, fields):
+    """
+    data 의 값을 instance 에 설정하고 값이 바뀐 필드 목록을 반환하는 메소드
+    """
+    changed_fields = []
+    for field_name in fields:
+        if field_name not in data:
+            continue
+        field = instance._meta.get_field(field_name)
+        if getattr(instance, field.attname) != data[field_name]:
+            setattr(instance, field.attname, data[field_name])
+            changed_fields.append(field.name)
+    return changed_fields
+
+
+def _clean(instance, fields):
+    """
+    StudySerializer 와 같은 수준으로 필드 값을 검증하고 변환하는 메소드
+    관계 필드는 _validate_relations 에서 한 번에 존재 여부를 검증한다
+    """
+    errors = {}
+    relation_fields = [field.name for field in instance._meta.concrete_fields if field.is_relation]
+    choice_fields = [field.name for field in instance._meta.concrete_fields if field.choices]
+    try:
+        instance.clean_fields(exclude=[field.name for field in instance._meta.concrete_fields if field.name not in fields] + relation_fields + choice_fields)
+    except DjangoValidationError as e:
+        errors.update(e.message_dict)
+    # IntegerChoices 값을 CharField 에 저장하므로 DRF ChoiceField 처럼 문자열로 비교한다
+    for field_name in choice_fields:
+        field = instance._meta.get_field(field_name)
+        value = getattr(instance, field.attname)
+        if field_name in fields and value not in (None, '') and str(value) not in {str(key) for key, _ in field.choices}:
+            errors[field_name] = [f'"{value}" is not a valid choice.']
+    return errors
+
+
+def _validate_relations(instances):
+    """
+    instances 가 참조하는 관계 필드 값이 모두 존재하는지 모델별로 쿼리 한 번에 검증하는 메소드
+    """
+    referenced_ids = {}
+    for instance in instances:
+        for field in instance._meta.concrete_fields:
+            value = getattr(instance, field.attname)
+            if field.is_relation and value is not None and field.name not in ('study', 'raw_document'):
+                referenced_ids.setdefault((field.name, field.related_model), set()).add(value)
+    for (field_name, model), ids in referenced_ids.items():
+        missing_ids = ids - set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        if missing_ids:
+            raise ValidationError({field_name: [f'Invalid pk "{pk}" - object does not exist.' for pk in sorted(missing_ids)]})
+
+
+def _save_reverse_relation(study, model, fields, items):
+    """
+    study 의 적재 중인 버전의 하위 데이터(intervention, eligibility)를 items 와 비교하여 bulk insert, update, delete 하는 메소드
+    게시된 버전에 포함된 행은 수정, 삭제하지 않고 study.version 에서 대체된 것으로 표시한 뒤 바뀐 행만 새로 추가한다
+    """
+    item_ids = [item['id'] for item in items if item.get('id') is not None]
+    existing_instances = {instance.pk: instance for instance in model.objects.current().filter(study=study)}
+    missing_ids = set(item_ids) - existing_instances.keys()
+    if missing_ids:
+        existing_instances.update(model.objects.in_bulk(missing_ids))
+    published_version = study.published_version or 0
+
+    created_instances, updated_instances, updated_fields, replaced_ids, errors = [], [], set(), [], []
+    for item in items:
+        instance = existing_instances.get(item.get('id')) or model(study=study)
+        changed_fields = _set_fields(instance, item, fields)
+        if instance.study_id != study.pk:
+            instance.study = study
+            changed_fields.append('study')
+        if instance.pk is not None and changed_fields and instance.added_version <= published_version:
+            replaced_ids.append(instance.pk)
+            instance.pk = None
+        if instance.pk is None:
+            instance.added_version = study.version
+        errors.append(_clean(instance, fields))
+        if instance.pk is None:
+            created_instances.append(instance)
+        elif changed_fields:
+            updated_instances.append(instance)
+            updated_fields.update(changed_fields)
+    if any(errors):
+        raise ValidationError({model._meta.verbose_name_plural: errors})
+    _validate_relations(created_instances + updated_instances)
+
+    removed_instances = model.objects.current().filter(study=study).exclude(pk__in=item_ids)
+    if published_version:
+        removed_instances.filter(added_version__lte=published_version).update(removed_version=study.version)
+    if replaced_ids:
+        model.objects.filter(pk__in=replaced_ids).update(removed_version=study.version)
+    removed_instances.delete()
+    model.objects.bulk_create(created_instances)
+    if updated_instances:
+        model.objects.bulk_update(updated_instances, updated_fields)
+
+
+def _save_conditions(study, items):
+    """
+    study 의 condition 을 items 로 찾거나 생성하여 연결하는 메소드
+    condition 은 여러 임상 연구가 공유하므로 이미 있는 condition 은 수정하지 않고 연결만 한다
+    """
+    items = [dict(item) for item in items]
+    for item in items:
+        if 'translate_from_condition' in item:
+            item.setdefault('original_condition', item.pop('translate_from_condition'))
+    conditions = Condition.objects.in_bulk([item['id'] for item in items if item.get('id') is not None])
+    created_conditions, errors = [], []
+    for item in items:
+        if item.get('id') in conditions:
+            errors.append({})
+            continue
+        condition = Condition()
+        _set_fields(condition, item, CONDITION_FIELDS)
+        errors.append(_clean(condition, CONDITION_FIELDS))
+        created_conditions.append(condition)
+    if any(errors):
+        raise ValidationError({'conditions': errors})
+    _validate_relations(created_conditions)
+
+    # 같은 condition 이 이미 있으면 새로 만들지 않고 연결하고, 없는 condition 만 한 번에 생성한다
+    condition_cache.get_or_create_many(created_conditions)
+    study.conditions.set(list(conditions.values()) + created_conditions)
+
+
+def lock_study(study):
+    """
+    임상 연구 행을 잠그고, study 를 불러온 뒤 새 버전이 적재되었으면(save_updated_studies) superseded 오류를 발생시키는 메소드
+    이전 버전으로 변환, 번역한 데이터가 새 버전의 원본 문서, 상태를 덮어쓰지 않도록 저장하기 전에 호출한다
+    """
+    versions = list(Study.objects.select_for_update().filter(pk=study.pk).values_list('version', flat=True))
+    if versions != [study.version]:
+        raise ValidationError({'version': [f'{study.version} 버전 이후 새 버전이 적재되었습니다.']}, code='superseded')
+
+
+def save_study(data, instance=None):
+    """
+    convert_studies_batch, translate_studies_batch 결과(data)를 StudySerializer 와 같은 수준으로 검증하고,
+    하위 데이터는 기존 데이터와 비교하여 bulk 로 저장하는 메소드
+    저장된 임상 연구는 행을 잠근 뒤 바뀐 필드만 저장하여 동시에 저장된 다른 필드를 덮어쓰지 않는다
+    """
+    study = instance or Study()
+    if study.pk is not None:
+        lock_study(study)
+    changed_fields = _set_fields(study, data, STUDY_FIELDS)
+    errors = _clean(study, STUDY_FIELDS)
+    if not errors:
+        try:
+            study.validate_unique()
+        except DjangoValidationError as e:
+            errors.update({'non_field_errors' if field == '__all__' else field: messages for field, messages in e.message_dict.items()})
+    if errors:
+        raise ValidationError(errors)
+    _validate_relations([study])
+    if study.pk is None:
+        study.save()
+    else:
+        study.save(update_fields=changed_fields)
+
+    for field_name, (model, fields) in REVERSE_RELATIONS.items():
+        if field_name in data:
+            _save_reverse_relation(study, model, fields, data[field_name])
+    if 'conditions' in data:
+        _save_conditions(study, data['conditions'])
+    return study